@@ -8,19 +8,13 @@ from app.schemas.chat import ChatRequest, ChatResponse, MessageResponse, ChatSes
 from app.schemas.mask import MaskRequest
 from app.services import chat_service
 from app.services.chat_service import process_chat
-from app.services.extraction_service import file_extractor_service
-from app.services.masking_service import PIIMaskerService
+from app.services.ingestion_queue import enqueue_file
 from app.dependencies import verify_jwt
 from app.models import ChatSession, Message, MessageFile, File
 from uuid import UUID
 from datetime import datetime
-import os
 import json
-from app.services.agents.rag_agent import DocumentRAG
-from app.config import Config
 
-config = Config()
-rag = DocumentRAG(config)
 router = APIRouter(prefix="/api")
 
 # route to get all messages of a session
@@ -67,9 +61,6 @@ async def continue_chat(
     user=Depends(verify_jwt),
     db: Session = Depends(get_db)
 ):
-    # Initialize services
-    pii_masker_service = PIIMaskerService()
-    
     # Verify the session belongs to the user
     chat_session = db.query(ChatSession).filter(ChatSession.id == session_id,
                                                 ChatSession.user_id == user.user.id).first()
@@ -100,6 +91,7 @@ async def continue_chat(
 
     # Handle file URLs and text extraction
     uploaded_files = []
+    ingestion_jobs = []
     extracted_text_content = ""
     
     if request.fileUrls:
@@ -122,22 +114,16 @@ async def continue_chat(
                 db.add(message_file)
                 uploaded_files.append(file_obj)
 
-                # Use already extracted text or extract if needed
+                # Use already extracted text, otherwise queue extraction + ingestion for the worker
                 if file_obj.extracted_text:
                     all_extracted_text.append(f"From file '{file_obj.filename}':\n{file_obj.extracted_text}")
                 else:
-                    # Extract text from the file
-                    try:
-                        file_extension = os.path.splitext(file_obj.filename)[1]
-                        print(f"Extracting text from file {file_obj.filename} with extension {file_extension}")
-                        extracted_text = file_extractor_service.extract_text(file_url, file_extension)
-                        if extracted_text:
-                            # Save extracted text to database
-                            file_obj.extracted_text = extracted_text
-                            all_extracted_text.append(f"From file '{file_obj.filename}':\n{extracted_text}")
-                            rag.ingest_file(extracted_text, file_url)
-                    except Exception as e:
-                        print(f"Error extracting text from file {file_obj.filename}: {str(e)}")
+                    # Savepoint: if enqueueing fails only this file's job is rolled back
+                    with db.begin_nested():
+                        job = enqueue_file(db, file_obj)
+                    ingestion_jobs.append(job)
+                    print(f"Queued ingestion job {job.id} for file {file_obj.filename}")
+                    all_extracted_text.append(f"From file '{file_obj.filename}':\n(This file is still being processed; its content is not available yet.)")
 
             except Exception as e:
                 print(f"Error processing file URL {file_url}: {str(e)}")
@@ -172,7 +158,11 @@ async def continue_chat(
     # Create chat messages for processing with RAG context
     chat_messages = [{"role": "user", "content": processing_content}]
     
-    return await process_chat(request.model, chat_messages, db, session_id, mapping)
+    response = await process_chat(request.model, chat_messages, session_id, mapping)
+    if ingestion_jobs:
+        # Client can poll GET /file/jobs/{job_id} for these
+        response.headers["X-Ingestion-Jobs"] = ",".join(str(job.id) for job in ingestion_jobs)
+    return response
 
 
 # route to get all chat sessions
@@ -4,6 +4,7 @@ import tempfile
 import requests
 from urllib.parse import urlparse
 import os
+from typing import Optional
 
 from fastapi import APIRouter, Depends, UploadFile, File as FastAPIFile, HTTPException
 from app.schemas import file as file_schema
@@ -11,6 +12,8 @@ from app.database.database import get_db
 from sqlalchemy.orm import Session
 from app.services.extraction_service import file_extractor_service
 from app.models.file import File
+from app.models.ingestion_job import IngestionJob
+from app.services.ingestion_queue import get_jobs_for_user
 from app.services.minio_service import upload_file_to_minio, delete_file_from_minio
 from uuid import uuid4
 from datetime import datetime
@@ -135,6 +138,23 @@ def extract_file_api(body:dict, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
+@router.get("/jobs", response_model=list[file_schema.IngestionJobResponse])
+def get_ingestion_jobs(file_id: Optional[int] = None, user=Depends(verify_jwt), db: Session = Depends(get_db)):
+    """
+    API lấy trạng thái các job extract + ingest của người dùng (lọc theo file_id nếu có).
+    """
+    return get_jobs_for_user(db, user.user.id, file_id)
+
+@router.get("/jobs/{job_id}", response_model=file_schema.IngestionJobResponse)
+def get_ingestion_job(job_id: uuid.UUID, user=Depends(verify_jwt), db: Session = Depends(get_db)):
+    """
+    API lấy trạng thái một job extract + ingest.
+    """
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id, IngestionJob.user_id == user.user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
 @router.get("", response_model=list[file_schema.FileResponse])
 def get_files(user_id: str, db: Session = Depends(get_db)):
     """
@@ -6,13 +6,11 @@ from app.schemas import mask as mask_schema
 from app.database.database import get_db
 from sqlalchemy.orm import Session
 from app.models.mask_mapping import MaskMapping
-from app.services.masking_service import PIIMaskerService
-from app.services.unmasking_service import PIIUnmaskerService
+from app.services.masking_service import pii_masker_service
+from app.services.unmasking_service import pii_unmasker_service
 from app.services.notification_service import notification_service
 # Khởi tạo router cho nhóm API mask, prefix là /mask, gắn tag "Mask" để phân loại trên docs
 router = APIRouter(prefix="/mask", tags=["Mask"])
-pii_masker_service = PIIMaskerService()
-pii_unmasker_service = PIIUnmaskerService()
 # Phần này của AI
 # API masking nội dung hội thoại
 # Nhận conversation_id và content, gọi service masking, lưu mapping vào DB, trả về masked_text và mapping
@@ -55,6 +53,11 @@ def get_mask_mapping(chat_id: int, db: Session = Depends(get_db)):
     mapping = mapping_obj.mapping if mapping_obj else {}
     return {"mapping": mapping}
 
+# API xem thống kê cache pseudonym của service masking (hits / misses / evictions)
+@router.get("/cache-stats", response_model=dict)
+def get_mask_cache_stats():
+    return pii_masker_service.get_cache_stats()
+
 # API kiểm tra nội dung có chứa thông tin nhạy cảm không
 # Nhận text/content từ request, gọi service AI để phát hiện nhạy cảm, trả về kết quả từ service
 @router.post("/validate-sensitive", response_model=dict)
@@ -25,6 +25,13 @@ class AgentDecisionConfig:
             openai_api_version=os.getenv("openai_api_version"),
             temperature=0.1  # Deterministic for factual accuracy
         )
+        # Số LLM call đồng thời tối đa của một worker (thay cho thread pool 4 luồng)
+        self.max_concurrent_llm_calls = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", 32))
+        # True: một LLM call "query planner" trả về rewrite + routing + expansion
+        # False: giữ chế độ cũ với ba LLM call tuần tự (rewrite, route, expand)
+        self.use_query_planner = os.getenv("USE_QUERY_PLANNER", "true").lower() == "true"
+        # Router cục bộ (heuristic + so khớp ví dụ) bỏ qua LLM routing cho các query hiển nhiên
+        self.use_fast_router = os.getenv("USE_FAST_ROUTER", "true").lower() == "true"
 
 class ConversationConfig:
     def __init__(self):
@@ -36,6 +43,11 @@ class ConversationConfig:
             openai_api_version=os.getenv("openai_api_version"),
             temperature=0.7  # Creative but factual for general Q&A
         )
+        # Cache câu trả lời theo embedding của query đã mask (dùng chung giữa các user)
+        self.use_response_cache = os.getenv("USE_RESPONSE_CACHE", "true").lower() == "true"
+        self.response_cache_threshold = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95))
+        self.response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE", 512))
+        self.response_cache_ttl = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
 
 class RAGConfig:
     def __init__(self):
@@ -44,9 +56,20 @@ class RAGConfig:
         self.distance_metric = "Cosine"
         self.weaviate_url = os.getenv("WEAVIATE_URL")  # Thêm URL cho Weaviate
         self.weaviate_api_key = os.getenv("WEAVIATE_API_KEY")  # Thêm API key cho Weaviate
+        self.weaviate_pool_size = 4  # Số kết nối Weaviate tối đa dùng đồng thời
+        self.max_concurrent_retrievals = 8  # Số truy vấn Weaviate / rerank chạy đồng thời trong thread
         self.collection_name = "document_assistance_rag"
-        self.chunk_size = 512
-        self.chunk_overlap = 50
+        self.chunk_size = 512  # token
+        self.chunk_overlap = 50  # token
+        # "local": chunk theo heading markdown + token, không gọi mạng
+        # "llm": chunk local rồi để chunker_model gộp các phần liền nhau cùng chủ đề
+        self.chunking_strategy = os.getenv("CHUNKING_STRATEGY", "local").lower()
+        # Embed khi ingest: chia batch, gửi song song, giới hạn token/phút và tự chờ khi bị 429
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+        self.embedding_max_concurrency = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4))
+        self.embedding_tokens_per_minute = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 0))  # 0: không giới hạn
+        self.embedding_max_retries = 5
+        self.ingest_prefetch_files = int(os.getenv("INGEST_PREFETCH_FILES", 4))  # Số file chunk + embed trước khi insert
         self.embedding_model = AzureOpenAIEmbeddings(
             deployment=os.getenv("embedding_deployment_name"),
             model=os.getenv("embedding_model_name"),
@@ -97,6 +120,66 @@ class RAGConfig:
         self.context_limit = 20  # Last 20 messages (10 Q&A pairs) in history
         self.use_hybrid_search = True
         self.hybrid_alpha = 0.5  # 0.0: chỉ BM25, 1.0: chỉ semantic, 0.5: cân bằng
+
+class MaskingConfig:
+    def __init__(self):
+        # Cache pseudonym trong bộ nhớ, key (entity_type, hash_key) -> pseudonym
+        self.pseudonym_cache_size = int(os.getenv("PII_CACHE_SIZE", 10000))
+        self.pseudonym_cache_ttl = int(os.getenv("PII_CACHE_TTL_SECONDS", 3600))  # 0: không hết hạn
+
+class EmbeddingCacheConfig:
+    def __init__(self):
+        # Cache embedding của query, key (tên model, text đã chuẩn hóa) -> vector
+        self.max_size = int(os.getenv("EMBEDDING_CACHE_SIZE", 4096))
+        self.ttl = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 0))  # 0: không hết hạn
+        # File sqlite giữ cache qua các lần restart (ingest lại tài liệu cũ không phải embed lại),
+        # đặt EMBEDDING_CACHE_DB="" để chỉ dùng bộ nhớ
+        self.db_path = os.getenv("EMBEDDING_CACHE_DB", "data/embedding_cache.sqlite3") or None
+
+class IngestionQueueConfig:
+    def __init__(self):
+        # Hàng đợi extract + ingest file đính kèm, xử lý bởi ingestion_worker.py
+        self.poll_interval = float(os.getenv("INGESTION_POLL_INTERVAL_SECONDS", 2))
+        self.max_attempts = int(os.getenv("INGESTION_MAX_ATTEMPTS", 3))
+        # Job "running" quá lâu (worker bị dừng giữa chừng) được đưa lại về "pending"
+        self.stale_after_seconds = int(os.getenv("INGESTION_STALE_AFTER_SECONDS", 1800))
+        # Chu kỳ worker kiểm tra job bị treo
+        self.stale_check_interval = float(os.getenv("INGESTION_STALE_CHECK_INTERVAL_SECONDS", 60))
+        # Thời gian chờ trước lần thử lại, nhân đôi sau mỗi lần thất bại
+        self.retry_backoff_seconds = float(os.getenv("INGESTION_RETRY_BACKOFF_SECONDS", 30))
+
+class ExtractionConfig:
+    def __init__(self):
+        # True: extract trong một process riêng giữ model SmolDocling, process gọi (API) không tải torch
+        self.use_worker_process = os.getenv("EXTRACTION_WORKER_PROCESS", "false").lower() == "true"
+        # Extract PDF song song: text theo dải trang trong process pool, ảnh đưa vào model theo thứ tự
+        self.pdf_parallel = os.getenv("PDF_PARALLEL_EXTRACTION", "false").lower() == "true"
+        self.pdf_workers = int(os.getenv("PDF_EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+        self.pdf_parallel_min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 8))  # PDF ngắn hơn chạy tuần tự
+        # Chỉ OCR ảnh PDF có khả năng chứa nội dung (bỏ logo, icon, ảnh trang trí, ảnh lặp lại)
+        self.pdf_image_filter = os.getenv("PDF_IMAGE_FILTER", "true").lower() == "true"
+        self.pdf_min_text_coverage = float(os.getenv("PDF_MIN_TEXT_COVERAGE", 0.15))  # tỉ lệ diện tích trang là text
+        self.pdf_min_image_px = int(os.getenv("PDF_MIN_IMAGE_PX", 100))
+        self.pdf_min_image_area_ratio = float(os.getenv("PDF_MIN_IMAGE_AREA_RATIO", 0.05))
+        self.pdf_text_page_image_area_ratio = float(os.getenv("PDF_TEXT_PAGE_IMAGE_AREA_RATIO", 0.3))
+        # SmolDocling: số ảnh mỗi lần generate và số token sinh tối đa cho mỗi ảnh
+        self.image_batch_size = int(os.getenv("SMOLDOCLING_BATCH_SIZE", 4))
+        self.image_max_new_tokens = int(os.getenv("SMOLDOCLING_MAX_NEW_TOKENS", 8192))
+        # Tải file từ URL theo từng khối (không giữ cả file trong bộ nhớ)
+        self.download_chunk_size = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+        self.download_timeout = float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", 60))
+        # Cache text đã extract theo SHA-256 nội dung file: "local", "minio" hoặc "none"
+        self.cache_backend = os.getenv("EXTRACTION_CACHE", "local").lower()
+        self.cache_dir = os.getenv("EXTRACTION_CACHE_DIR", "data/extraction_cache")
+        self.cache_prefix = os.getenv("EXTRACTION_CACHE_PREFIX", "extraction-cache/")  # dùng với "minio"
+
+class StorageConfig:
+    def __init__(self):
+        # Đọc file đã upload trực tiếp từ storage thay vì tải lại qua presigned URL
+        # "minio": bucket của minio_service, "local": thư mục STORAGE_LOCAL_ROOT (<bucket>/<key>, dùng cho test)
+        self.backend = os.getenv("STORAGE_BACKEND", "minio").lower()
+        self.local_root = os.getenv("STORAGE_LOCAL_ROOT", "data/storage")
+
 class APIConfig:
     def __init__(self):
         self.host = "0.0.0.0"
@@ -113,6 +196,11 @@ class Config:
         self.agent_decision = AgentDecisionConfig()
         self.conversation = ConversationConfig()
         self.rag = RAGConfig()
+        self.masking = MaskingConfig()
+        self.embedding_cache = EmbeddingCacheConfig()
+        self.ingestion_queue = IngestionQueueConfig()
+        self.extraction = ExtractionConfig()
+        self.storage = StorageConfig()
         self.api = APIConfig()
         self.ui = UIConfig()
         self.max_conversation_history = 20
\ No newline at end of file
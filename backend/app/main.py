@@ -1,4 +1,8 @@
 import os
+import time
+import logging
+
+_import_started_at = time.perf_counter()
 
 # import google.generativeai as genai
 from dotenv import load_dotenv, find_dotenv
@@ -8,9 +12,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.routers import chat, file, mask, ai
 from app.config import Config
 from app.database.database import engine, Base
-from app.models import chat_session, mask_mapping, rag_document, message, pii_mapping, file as file_models, profile
+from app.services.agents.agent_decision import get_agent_graph
+from app.services.agents.rag_agent import close_document_rag
+from app.services.agents.rag_agent.chunker import get_token_counter
+from app.models import chat_session, mask_mapping, rag_document, message, pii_mapping, file as file_models, profile, ingestion_job
 _ = load_dotenv(find_dotenv()) # read local .env file
 
+logger = logging.getLogger(__name__)
+# Chi tiết thời gian import từng module: python import_report.py
+_import_seconds = time.perf_counter() - _import_started_at
+
 config = Config()
 # Configure Gemini API
 # TODO: remove
@@ -25,6 +36,7 @@ def create_tables():
     mask_mapping.Base.metadata.create_all(bind=engine)
     rag_document.Base.metadata.create_all(bind=engine)
     pii_mapping.Base.metadata.create_all(bind=engine)
+    ingestion_job.Base.metadata.create_all(bind=engine)
     
 
 app = FastAPI()
@@ -41,8 +53,15 @@ from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    startup_started_at = time.perf_counter()
     create_tables()
+    # Compile the agent graph once at startup instead of on the first chat request
+    get_agent_graph()
+    # Load the tokenizer's BPE file now rather than on the first document upload
+    get_token_counter()
+    logger.info(f"Startup: imports {_import_seconds:.2f}s, lifespan {time.perf_counter() - startup_started_at:.2f}s")
     yield
+    close_document_rag()
 
 app.router.lifespan_context = lifespan
 
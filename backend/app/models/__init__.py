@@ -2,3 +2,4 @@ from .chat_session import ChatSession
 from .message import Message
 from .message_file import MessageFile
 from .file import File
+from .ingestion_job import IngestionJob
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, Text, DateTime, Index, func, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from app.database.database import Base
+import uuid
+
+# Điều kiện của unique index một phần: job đang chờ / đang chạy
+ACTIVE_JOB_CONDITION = "status IN ('pending', 'running')"
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    file_id = Column(Integer, ForeignKey("files.file_id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending | running | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # Job thất bại chỉ được lấy lại sau thời điểm này (backoff giữa các lần thử)
+    next_attempt_at = Column(DateTime)
+    file = relationship("File")
+
+    __table_args__ = (
+        Index("idx_ingestion_jobs_status_created", "status", "created_at"),
+        Index("idx_ingestion_jobs_file", "file_id"),
+        # Mỗi file chỉ có tối đa một job đang chờ / đang chạy (enqueue_file dùng ON CONFLICT DO NOTHING)
+        Index(
+            "uq_ingestion_jobs_active_file", "file_id", unique=True,
+            postgresql_where=text(ACTIVE_JOB_CONDITION)
+        ),
+    )
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
+from uuid import UUID
 from datetime import datetime
 
 class FileUploadRequest(BaseModel):
@@ -27,3 +28,13 @@ class FileResponse(BaseModel):
     filename: str
     file_path: str
     created_at: datetime
+
+class IngestionJobResponse(BaseModel):
+    id: UUID
+    file_id: int
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
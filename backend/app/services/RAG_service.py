@@ -8,6 +8,8 @@ from langchain.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
 import google.generativeai as genai
 
+from app.services.embedding_cache import get_embedding_cache
+
 class GeminiChat:
     """Adapter for using Gemini in the pipeline."""
     def __init__(self, model_name: str = "gemini-2.5-flash", api_key: Optional[str] = None):
@@ -84,7 +86,7 @@ class RAGPipelineService:
                 model_kwargs={'device': device},
                 encode_kwargs={'normalize_embeddings': True}
             )
-        return self.embedding_model.embed_query(query)
+        return get_embedding_cache().embed_query(self.embedding_model, query)
 
     async def query_documents(self, query: str) -> str:
         """Embed query, retrieve relevant documents, and create a prompt."""
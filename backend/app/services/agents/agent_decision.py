@@ -1,15 +1,23 @@
 import json
-from typing import Dict, List, Optional, Any, Literal, TypedDict, Union, Annotated
+import asyncio
+from typing import Dict, List, Optional, Any, Literal, TypedDict, Union, Annotated, AsyncIterator
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langgraph.graph import MessagesState, StateGraph, END
 import os, getpass
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 from langgraph.checkpoint.memory import MemorySaver
 
 from app.config import Config
-from app.services.agents.rag_agent import DocumentRAG
+from app.services.agents.rag_agent import get_document_rag
+from app.services.agents.concurrency import llm_slots
+from app.services.agents.fast_router import FastRouter, PSEUDONYM_PATTERN, extract_routing_examples
+from app.services.semantic_cache import SemanticCache
+from app.services.embedding_cache import get_embedding_cache
 
 load_dotenv()
 
@@ -19,8 +27,9 @@ config = Config()
 # Initialize memory
 memory = MemorySaver()
 
-# Specify a thread
-thread_config = {"configurable": {"thread_id": "1"}}
+# Compiled agent graph, built once per process by get_agent_graph()
+_agent_graph = None
+_agent_graph_lock = threading.Lock()
 
 # Agent configuration
 class AgentConfig:
@@ -28,12 +37,10 @@ class AgentConfig:
     
     DECISION_MODEL = "gpt-4o"  # or whichever model you prefer
     CONFIDENCE_THRESHOLD = 0.55
+    # Tags of the LLM calls whose tokens are the final answer and get streamed to the client
+    STREAMED_RESPONSE_TAGS = {"conversation_response", "rag_response"}
     
-    DECISION_SYSTEM_PROMPT = """You are an intelligent routing system that routes user queries to 
-    the appropriate specialized agent. Your job is to analyze the user's request and determine which agent 
-    is best suited to handle it based on the query content and conversation context.
-
-    Available agents:
+    ROUTING_GUIDELINES = """Available agents:
     1. CONVERSATION_AGENT - For general chat, greetings, casual questions, current events, weather, news, general knowledge, and real-time information.
     2. RAG_AGENT - For specific factual questions about people, companies, data, statistics, or detailed information that would be found in documents.
 
@@ -76,7 +83,13 @@ class AgentConfig:
     - "What is John Smith's role in the marketing department?" → Specific person + specific information
     - "Show me the policy for remote work" → Specific documented information
     - "What was the revenue of XYZ Corp last year?" → Company + specific financial data
+    """
 
+    DECISION_SYSTEM_PROMPT = """You are an intelligent routing system that routes user queries to 
+    the appropriate specialized agent. Your job is to analyze the user's request and determine which agent 
+    is best suited to handle it based on the query content and conversation context.
+
+    """ + ROUTING_GUIDELINES + """
     You must provide your answer in JSON format with the following structure:
     {{
     "agent": "AGENT_NAME",
@@ -85,6 +98,31 @@ class AgentConfig:
     }}
     """
 
+    QUERY_PLANNER_PROMPT = """You are the query planner of a document assistant. In a single step you must:
+    1. Rewrite the user's query in simple, clear English, keeping its original meaning and intent.
+    2. Decide which specialized agent should handle the rewritten query.
+    3. If the agent is RAG_AGENT, expand the rewritten query with relevant terminology, synonyms, and related
+       concepts that would help in retrieving relevant information. Expand only if required, otherwise keep the
+       rewritten query intact. Stay specific to the domain of the query. If the query asks for a tabular
+       answer, keep that request in the expanded query.
+
+    """ + ROUTING_GUIDELINES + """
+    You must provide your answer in JSON format with the following structure:
+    {{
+    "rewritten_query": "The rewritten query",
+    "agent": "AGENT_NAME",
+    "reasoning": "Your step-by-step reasoning for selecting this agent",
+    "confidence": 0.95,  // Value between 0.0 and 1.0 indicating your confidence in this decision
+    "expanded_query": "The expanded retrieval query, or the rewritten query if no expansion is needed"
+    }}
+    """
+
+    AGENT_NAMES = {"CONVERSATION_AGENT", "RAG_AGENT"}
+
+    # Local fast-path router: minimum example similarity and lead over the other agent
+    FAST_ROUTER_THRESHOLD = 0.6
+    FAST_ROUTER_MARGIN = 0.15
+
 class AgentState(MessagesState):
     """State maintained across the workflow."""
     agent_name: Optional[str]
@@ -93,6 +131,7 @@ class AgentState(MessagesState):
     retrieval_confidence: float
     bypass_routing: bool
     insufficient_info: bool
+    query_plan: Optional[Dict]
 
 class AgentDecision(TypedDict):
     """Output structure for the decision agent."""
@@ -100,6 +139,14 @@ class AgentDecision(TypedDict):
     reasoning: str
     confidence: float
 
+class QueryPlan(TypedDict):
+    """Output structure for the combined query planner."""
+    rewritten_query: str
+    agent: str
+    reasoning: str
+    confidence: float
+    expanded_query: str
+
 def create_agent_graph():
     """Create and configure the LangGraph for agent orchestration."""
     decision_model = config.conversation.llm
@@ -111,16 +158,111 @@ def create_agent_graph():
     ])
     
     decision_chain = decision_prompt | decision_model | json_parser
+    
+    planner_prompt = ChatPromptTemplate.from_messages([
+        ("system", AgentConfig.QUERY_PLANNER_PROMPT),
+        ("human", "{input}")
+    ])
+    
+    planner_chain = planner_prompt | config.agent_decision.llm | json_parser
+    
+    fast_router = FastRouter(
+        extract_routing_examples(AgentConfig.DECISION_SYSTEM_PROMPT),
+        threshold=AgentConfig.FAST_ROUTER_THRESHOLD,
+        margin=AgentConfig.FAST_ROUTER_MARGIN
+    )
+    
+    response_cache = SemanticCache(
+        threshold=config.conversation.response_cache_threshold,
+        max_size=config.conversation.response_cache_size,
+        ttl=config.conversation.response_cache_ttl
+    )
 
-    def analyze_input(state: AgentState) -> AgentState:
-        """Analyze the input."""
+    async def analyze_input(state: AgentState) -> AgentState:
+        """Analyze the input.
+        
+        Obvious queries are routed locally by the fast-path router. Otherwise, with the query
+        planner enabled, rewrite, routing and retrieval expansion come from a single LLM call
+        here; if planning fails the query is rewritten and routed the old way.
+        """
+        current_input = state["current_input"]
+        input_text = _query_text(current_input) if current_input else ""
+        
+        if config.agent_decision.use_fast_router:
+            start_time = time.perf_counter()
+            # Small talk is decided from the text alone, without touching the knowledge base
+            fast_route = fast_router.precheck(input_text)
+            if fast_route is None:
+                # Built inside the thread: the first call creates DocumentRAG (Weaviate, reranker)
+                has_documents = await asyncio.to_thread(lambda: get_document_rag(config).has_documents())
+                fast_route = fast_router.route(input_text, has_documents=has_documents)
+            # In planner mode a RAG query still goes through the planner, which also produces
+            # the rewrite and retrieval expansion in the same call.
+            if fast_route and (fast_route.agent != "RAG_AGENT" or not config.agent_decision.use_query_planner):
+                elapsed_ms = (time.perf_counter() - start_time) * 1000
+                print(f"Routing path: fast_path ({fast_route.reason}) -> {fast_route.agent}, confidence {fast_route.confidence:.2f}, {elapsed_ms:.2f} ms")
+                return {
+                    **state,
+                    "agent_name": fast_route.agent,
+                    "bypass_routing": True
+                }
+        
+        if not config.agent_decision.use_query_planner or not input_text:
+            return {
+                **state,
+                "bypass_routing": False
+            }
+        
+        start_time = time.perf_counter()
+        query_plan = None
+        try:
+            async with llm_slots(config):
+                plan = await planner_chain.ainvoke({"input": input_text})
+            if isinstance(plan, dict) and plan.get("rewritten_query") and plan.get("agent") in AgentConfig.AGENT_NAMES:
+                query_plan = plan
+            else:
+                print(f"Invalid query plan, falling back to three-step mode: {plan}")
+        except Exception as e:
+            print(f"Error in query planner, falling back to three-step mode: {e}")
+        
+        if query_plan:
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            print(f"Routing path: query_planner -> {query_plan['agent']}, {elapsed_ms:.2f} ms")
+        
+        rewritten_text = query_plan["rewritten_query"] if query_plan else await _arewrite_query(input_text)
+        if isinstance(current_input, dict):
+            current_input = {**current_input, "text": rewritten_text}
+        else:
+            current_input = rewritten_text
+        
         return {
             **state,
-            "bypass_routing": False
+            "current_input": current_input,
+            "query_plan": query_plan,
+            "bypass_routing": query_plan is not None
         }
     
-    def route_to_agent(state: AgentState) -> AgentState:
+    async def route_to_agent(state: AgentState) -> AgentState:
         """Make decision about which agent should handle the query."""
+        query_plan = state.get("query_plan")
+        if state.get("bypass_routing") and not query_plan and state.get("agent_name"):
+            # Already routed by the fast-path router in analyze_input
+            return state
+        if state.get("bypass_routing") and query_plan:
+            print(f"Decision (query planner): {query_plan['agent']}")
+            try:
+                confidence = float(query_plan.get("confidence", 0.0))
+            except (TypeError, ValueError):
+                confidence = 0.0
+            if confidence < AgentConfig.CONFIDENCE_THRESHOLD:
+                agent_name = "CONVERSATION_AGENT"
+            else:
+                agent_name = query_plan["agent"]
+            return {
+                **state,
+                "agent_name": agent_name
+            }
+        
         messages = state["messages"]
         current_input = state["current_input"]
         
@@ -147,8 +289,11 @@ def create_agent_graph():
         """
         
         try:
-            decision = decision_chain.invoke({"input": decision_input})
-            print(f"Decision: {decision['agent']}")
+            start_time = time.perf_counter()
+            async with llm_slots(config):
+                decision = await decision_chain.ainvoke({"input": decision_input})
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            print(f"Routing path: llm_decision -> {decision['agent']}, {elapsed_ms:.2f} ms")
             
             if decision["confidence"] < AgentConfig.CONFIDENCE_THRESHOLD:
                 agent_name = "CONVERSATION_AGENT"
@@ -166,7 +311,7 @@ def create_agent_graph():
                 "agent_name": "CONVERSATION_AGENT"
             }
     
-    def run_conversation_agent(state: AgentState) -> AgentState:
+    async def run_conversation_agent(state: AgentState) -> AgentState:
         """Handle general conversation queries."""
         print(f"Selected agent: CONVERSATION_AGENT")
         
@@ -185,7 +330,6 @@ def create_agent_graph():
             ("human", "{input}")
         ])
         
-        messages = state["messages"]
         query = state["current_input"]
         
         if isinstance(query, dict):
@@ -193,7 +337,31 @@ def create_agent_graph():
         else:
             input_text = query
         
-        response = config.conversation.llm.invoke(conversation_prompt.format_messages(input=input_text))
+        # Queries that mention a masked entity are answered per user and never cached
+        query_embedding = None
+        if config.conversation.use_response_cache and input_text and not PSEUDONYM_PATTERN.search(input_text):
+            try:
+                query_embedding = await get_embedding_cache().aembed_query(config.rag.embedding_model, input_text.lower())
+            except Exception as e:
+                print(f"Error embedding query for the response cache: {e}")
+            if query_embedding is not None:
+                cached_output = response_cache.get(query_embedding)
+                if cached_output is not None:
+                    print("Response cache hit")
+                    return {
+                        **state,
+                        "output": cached_output,
+                        "agent_name": "CONVERSATION_AGENT"
+                    }
+        
+        async with llm_slots(config):
+            response = await config.conversation.llm.ainvoke(
+                conversation_prompt.format_messages(input=input_text),
+                config={"tags": ["conversation_response"]}
+            )
+        
+        if query_embedding is not None and response.content:
+            response_cache.set(input_text, query_embedding, response.content)
         
         return {
             **state,
@@ -201,66 +369,69 @@ def create_agent_graph():
             "agent_name": "CONVERSATION_AGENT"
         }
     
-    def run_rag_agent(state: AgentState) -> AgentState:
+    async def run_rag_agent(state: AgentState) -> AgentState:
         """Handle document-based queries using RAG."""
         print(f"Selected agent: RAG_AGENT")
         
-        rag_agent = DocumentRAG(config)
+        # Shared, long-lived RAG instance (pooled Weaviate connections, reranker loaded once)
+        rag_agent = get_document_rag(config)
+        
+        messages = state["messages"]
+        query = state["current_input"]
+        rag_context_limit = config.rag.context_limit
+        
+        recent_context = ""
+        for msg in messages[-rag_context_limit:]:
+            if isinstance(msg, HumanMessage):
+                recent_context += f"User: {msg.content}\n"
+            elif isinstance(msg, AIMessage):
+                recent_context += f"Assistant: {msg.content}\n"
         
+        # Retrieve first and decide on the fallback before generating, so a low-confidence
+        # answer is never generated (or streamed) only to be replaced afterwards.
         try:
-            messages = state["messages"]
-            query = state["current_input"]
-            rag_context_limit = config.rag.context_limit
-            
-            recent_context = ""
-            for msg in messages[-rag_context_limit:]:
-                if isinstance(msg, HumanMessage):
-                    recent_context += f"User: {msg.content}\n"
-                elif isinstance(msg, AIMessage):
-                    recent_context += f"Assistant: {msg.content}\n"
-            
-            response = rag_agent.process_query(query, chat_history=recent_context)
-            retrieval_confidence = response.get("confidence", 0.0)
-            
-            print(f"Retrieval Confidence: {retrieval_confidence}")
-            
-            # Đơn giản hóa xử lý response: giả sử response luôn là chuỗi văn bản
-            response_text = response["response"]
-            
-            # Weaviate trả về distance (thấp hơn = tốt hơn), chuyển đổi thành confidence
-            # Giả sử confidence cần scale từ distance (0-2) sang 0-1, với distance thấp là confidence cao
-            normalized_confidence = max(0.0, 1.0 - (retrieval_confidence / 2.0))
-            
-            insufficient_info = normalized_confidence < config.rag.min_retrieval_confidence
-            
-            print(f"Normalized Confidence: {normalized_confidence}")
-            print(f"Insufficient info flag set to: {insufficient_info}")
-            
-            if not insufficient_info:
-                response_output = AIMessage(content=response_text)
-                print("Using RAG response due to sufficient confidence")
-            else:
-                response_output = AIMessage(content="Tôi không có đủ thông tin đáng tin cậy để trả lời câu hỏi này một cách chính xác. Vui lòng thử diễn đạt lại câu hỏi hoặc cung cấp thêm ngữ cảnh.")
-                print("Using fallback response due to low confidence")
-            
-            return {
-                **state,
-                "output": response_output,
-                "retrieval_confidence": normalized_confidence,
-                "agent_name": "RAG_AGENT",
-                "insufficient_info": insufficient_info
-            }
+            expanded_query = (state.get("query_plan") or {}).get("expanded_query")
+            retrieval = await rag_agent.aretrieve(_query_text(query), expanded_query=expanded_query)
+        except Exception as e:
+            print(f"Error in RAG retrieval: {e}")
+            retrieval = {"query": query, "documents": [], "search_type": "none", "confidence": 0.0, "error": str(e)}
+        retrieval_confidence = retrieval.get("confidence", 0.0)
+        
+        print(f"Retrieval Confidence: {retrieval_confidence}")
+        
+        # Weaviate trả về distance (thấp hơn = tốt hơn), chuyển đổi thành confidence
+        # Giả sử confidence cần scale từ distance (0-2) sang 0-1, với distance thấp là confidence cao
+        normalized_confidence = max(0.0, 1.0 - (retrieval_confidence / 2.0))
+        
+        insufficient_info = normalized_confidence < config.rag.min_retrieval_confidence
         
-        finally:
-            # Always close the RAG agent connection
-            rag_agent.close()
+        print(f"Normalized Confidence: {normalized_confidence}")
+        print(f"Insufficient info flag set to: {insufficient_info}")
+        
+        if "error" in retrieval:
+            response_output = AIMessage(content=f"I encountered an error while processing your query: {retrieval['error']}")
+        elif not insufficient_info:
+            response = await rag_agent.agenerate(retrieval, chat_history=recent_context)
+            response_output = AIMessage(content=response["response"])
+            print("Using RAG response due to sufficient confidence")
+        else:
+            response_output = AIMessage(content="Tôi không có đủ thông tin đáng tin cậy để trả lời câu hỏi này một cách chính xác. Vui lòng thử diễn đạt lại câu hỏi hoặc cung cấp thêm ngữ cảnh.")
+            print("Using fallback response due to low confidence")
+        
+        return {
+            **state,
+            "output": response_output,
+            "retrieval_confidence": normalized_confidence,
+            "agent_name": "RAG_AGENT",
+            "insufficient_info": insufficient_info
+        }
     
     def decide_next_agent(state: AgentState) -> str:
         """Decide which agent to route to based on the decision made."""
         agent_name = state.get("agent_name", "CONVERSATION_AGENT")
         return agent_name
     
-    def process_output(state: AgentState) -> AgentState:
+    async def process_output(state: AgentState) -> AgentState:
         """Process the generated response."""
         output = state["output"]
         
@@ -303,6 +474,26 @@ def create_agent_graph():
     
     return workflow.compile(checkpointer=memory)
 
+def get_agent_graph():
+    """Return the compiled agent graph, compiling it on first use."""
+    global _agent_graph
+    if _agent_graph is None:
+        with _agent_graph_lock:
+            if _agent_graph is None:
+                _agent_graph = create_agent_graph()
+    return _agent_graph
+
+def _new_thread_config() -> Dict[str, Any]:
+    """Checkpointer config with a fresh thread id, so concurrent requests never share state."""
+    return {"configurable": {"thread_id": str(uuid.uuid4())}}
+
+def _release_thread(thread_config: Dict[str, Any]) -> None:
+    """Drop the checkpoints of a finished request thread from the in-memory saver."""
+    try:
+        memory.delete_thread(thread_config["configurable"]["thread_id"])
+    except Exception as e:
+        print(f"Error releasing graph thread: {e}")
+
 def init_agent_state() -> AgentState:
     """Initialize the agent state with default values."""
     return {
@@ -312,46 +503,68 @@ def init_agent_state() -> AgentState:
         "output": None,
         "retrieval_confidence": 0.0,
         "bypass_routing": False,
-        "insufficient_info": False
+        "insufficient_info": False,
+        "query_plan": None
     }
 
-def process_query(query: Union[str, Dict]) -> str:
-    """
-    Process a user query through the agent decision system.
-
-    Args:
-        query: User input (text string or dict with text)
-
-    Returns:
-        Response from the appropriate agent
-    """
-    graph = create_agent_graph()
-    state = init_agent_state()
-    
-    if isinstance(query, dict):
-        query_text = query.get("text", "")
-    else:
-        query_text = query
-    
-    if query_text:
-        rewrite_prompt = f"""Vui lòng viết lại truy vấn sau bằng tiếng Anh đơn giản, rõ ràng, giữ nguyên ý nghĩa và ý định ban đầu:
+def _rewrite_prompt(query_text: str) -> str:
+    return f"""Vui lòng viết lại truy vấn sau bằng tiếng Anh đơn giản, rõ ràng, giữ nguyên ý nghĩa và ý định ban đầu:
 
         Truy vấn gốc: {query_text}
 
         Truy vấn viết lại:"""
-        
-        rewritten_query = config.conversation.llm.invoke(rewrite_prompt)
-        
+
+def _query_text(query: Union[str, Dict]) -> str:
+    if isinstance(query, dict):
+        return query.get("text", "")
+    return query
+
+def _build_state(query: Union[str, Dict], query_text: str, rewritten_text: Optional[str]) -> AgentState:
+    """Build the initial graph state for a (possibly rewritten) query."""
+    state = init_agent_state()
+    
+    if rewritten_text is not None:
         if isinstance(query, dict):
-            query["text"] = rewritten_query.content
+            query["text"] = rewritten_text
         else:
-            query = rewritten_query.content
+            query = rewritten_text
     
     state["current_input"] = query
     display_text = query_text if query_text else str(query)
     state["messages"] = [HumanMessage(content=display_text)]
+    return state
+
+async def _arewrite_query(query_text: str) -> str:
+    async with llm_slots(config):
+        return (await config.conversation.llm.ainvoke(_rewrite_prompt(query_text))).content
+
+async def aprocess_query(query: Union[str, Dict]) -> dict:
+    """
+    Process a user query through the agent decision system.
+
+    All graph nodes are native async, so concurrency is bounded by the configured
+    LLM / retrieval semaphores rather than by a thread pool.
+
+    Args:
+        query: User input (text string or dict with text)
+
+    Returns:
+        Final graph state with the response from the appropriate agent
+    """
+    graph = get_agent_graph()
+    query_text = _query_text(query)
+    
+    rewritten_text = None
+    if query_text and not config.agent_decision.use_query_planner:
+        rewritten_text = await _arewrite_query(query_text)
     
-    result = graph.invoke(state, thread_config)
+    state = _build_state(query, query_text, rewritten_text)
+    
+    thread_config = _new_thread_config()
+    try:
+        result = await graph.ainvoke(state, thread_config)
+    finally:
+        _release_thread(thread_config)
     
     if len(result["messages"]) > config.max_conversation_history:
         result["messages"] = result["messages"][-config.max_conversation_history:]
@@ -359,4 +572,59 @@ def process_query(query: Union[str, Dict]) -> str:
     for m in result["messages"]:
         m.pretty_print()
     
-    return result
\ No newline at end of file
+    return result
+
+def process_query(query: Union[str, Dict]) -> dict:
+    """
+    Synchronous entry point for scripts; must not be called from a running event loop.
+
+    Args:
+        query: User input (text string or dict with text)
+
+    Returns:
+        Response from the appropriate agent
+    """
+    return asyncio.run(aprocess_query(query))
+
+async def astream_query(query: Union[str, Dict]) -> AsyncIterator[str]:
+    """
+    Stream the answer to a user query as text deltas.
+
+    Tokens of the final answer LLM call (conversation or RAG response) are yielded as soon
+    as the model produces them. Answers that do not come from a streamed LLM call (e.g. the
+    low-confidence RAG fallback) are yielded in one piece at the end. The concatenation of
+    all deltas is the final answer.
+
+    Args:
+        query: User input (text string or dict with text)
+    """
+    graph = get_agent_graph()
+    query_text = _query_text(query)
+    
+    rewritten_text = None
+    if query_text and not config.agent_decision.use_query_planner:
+        rewritten_text = await _arewrite_query(query_text)
+    
+    state = _build_state(query, query_text, rewritten_text)
+    
+    streamed = False
+    final_state = None
+    thread_config = _new_thread_config()
+    try:
+        async for mode, chunk in graph.astream(state, thread_config, stream_mode=["messages", "values"]):
+            if mode == "messages":
+                message, metadata = chunk
+                tags = metadata.get("tags") or []
+                if AgentConfig.STREAMED_RESPONSE_TAGS.intersection(tags) and isinstance(message.content, str) and message.content:
+                    streamed = True
+                    yield message.content
+            else:
+                final_state = chunk
+    finally:
+        _release_thread(thread_config)
+    
+    if not streamed and final_state:
+        output = final_state.get("output")
+        output_text = output.content if hasattr(output, "content") else str(output or "")
+        if output_text:
+            yield output_text
@@ -0,0 +1,22 @@
+import asyncio
+import weakref
+from typing import Dict
+
+# Semaphores are bound to the event loop they are used on, so keep one set per loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+def _get_semaphore(name: str, limit: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    loop_semaphores = _semaphores.setdefault(loop, {})
+    semaphore = loop_semaphores.get(name)
+    if semaphore is None:
+        semaphore = loop_semaphores[name] = asyncio.Semaphore(max(1, limit))
+    return semaphore
+
+def llm_slots(config) -> asyncio.Semaphore:
+    """Semaphore bounding the number of in-flight LLM calls of this process."""
+    return _get_semaphore("llm", config.agent_decision.max_concurrent_llm_calls)
+
+def retrieval_slots(config) -> asyncio.Semaphore:
+    """Semaphore bounding blocking retrieval work (Weaviate queries, reranking) run in threads."""
+    return _get_semaphore("retrieval", config.rag.max_concurrent_retrievals)
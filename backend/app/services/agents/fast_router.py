@@ -0,0 +1,140 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+# Short greetings / thanks / goodbyes that never need document retrieval
+SMALLTALK_PATTERN = re.compile(
+    r"^(hi|hello|hey|yo|good (morning|afternoon|evening)|how are you( doing)?|what'?s up|"
+    r"thanks?( you)?( so much| a lot)?|thank you( very much)?|ok(ay)?|cool|great|nice|"
+    r"bye|goodbye|see you|xin chào|chào( bạn)?|cảm ơn( bạn)?|tạm biệt)"
+    r"([ ,]+(there|bot|assistant|again|friend|bạn))*[ !.?]*$",
+    re.IGNORECASE
+)
+
+# Pseudonyms produced by PIIMaskerService (e.g. Name_3FA21C, ORGANIZATION_1B2C3D)
+PSEUDONYM_PATTERN = re.compile(r"\b[A-Za-z_]+_[0-9A-F]{6}\b")
+
+# Question / request words that, together with a named entity, ask for document facts
+FACT_REQUEST_PATTERN = re.compile(r"\b(what|when|which|who|where|how (much|many)|show|list|give)\b", re.IGNORECASE)
+
+# Example lines of the routing prompt: - "Hello, how are you?" → General greeting
+EXAMPLE_LINE_PATTERN = re.compile(r'^\s*-\s*"([^"]+)"\s*→')
+
+
+class FastRoute(NamedTuple):
+    """Routing decision taken without calling the LLM."""
+    agent: str
+    confidence: float
+    reason: str
+
+
+def extract_routing_examples(prompt: str) -> Dict[str, List[str]]:
+    """
+    Collect the example queries listed under "<AGENT> examples:" in a routing prompt.
+    """
+    examples: Dict[str, List[str]] = {}
+    current_agent = None
+    for line in prompt.splitlines():
+        header = re.match(r"^\s*([A-Z_]+_AGENT) examples:\s*$", line)
+        if header:
+            current_agent = header.group(1)
+            examples.setdefault(current_agent, [])
+            continue
+        match = EXAMPLE_LINE_PATTERN.match(line)
+        if match and current_agent:
+            examples[current_agent].append(match.group(1))
+        elif line.strip() and not match:
+            current_agent = None
+    return examples
+
+
+def _normalize(text: str) -> str:
+    text = PSEUDONYM_PATTERN.sub(" entityname ", text).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s']", " ", text)).strip()
+
+
+def _vectorize(text: str) -> Counter:
+    """Sparse bag of word unigrams and character trigrams."""
+    normalized = _normalize(text)
+    features = Counter(f"w:{word}" for word in normalized.split())
+    padded = f" {normalized} "
+    features.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(value * b.get(key, 0) for key, value in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class FastRouter:
+    """
+    Local pre-router that decides obvious queries in microseconds.
+
+    It combines a few heuristics (small talk, masked entity + fact request, empty knowledge
+    base) with a nearest-example classifier over the routing prompt's examples, using
+    sparse n-gram vectors. It only answers when confident; otherwise it returns None and the
+    caller falls back to the LLM router.
+    """
+    def __init__(self, examples: Dict[str, List[str]], threshold: float = 0.6, margin: float = 0.15,
+                 default_agent: str = "CONVERSATION_AGENT", document_agent: str = "RAG_AGENT"):
+        self.threshold = threshold
+        self.margin = margin
+        self.default_agent = default_agent
+        self.document_agent = document_agent
+        self.example_vectors = {
+            agent: [_vectorize(example) for example in agent_examples]
+            for agent, agent_examples in examples.items() if agent_examples
+        }
+
+    def precheck(self, text: str) -> Optional[FastRoute]:
+        """
+        Decisions that depend on the text alone (empty query, small talk). Callers run this
+        before looking up whether the knowledge base has documents.
+        """
+        stripped = text.strip() if text else ""
+        if not stripped:
+            return FastRoute(self.default_agent, 1.0, "empty query")
+        if SMALLTALK_PATTERN.match(stripped):
+            return FastRoute(self.default_agent, 0.99, "small talk")
+        return None
+
+    def route(self, text: str, has_documents: bool = True) -> Optional[FastRoute]:
+        """
+        Return a confident routing decision for `text`, or None if the LLM should decide.
+
+        Args:
+            text: The (masked) user query
+            has_documents: False if the knowledge base is known to be empty
+        """
+        decision = self.precheck(text)
+        if decision:
+            return decision
+
+        stripped = text.strip()
+        if not has_documents:
+            return FastRoute(self.default_agent, 0.95, "no ingested documents")
+
+        if PSEUDONYM_PATTERN.search(stripped) and FACT_REQUEST_PATTERN.search(stripped):
+            return FastRoute(self.document_agent, 0.9, "fact request about a named entity")
+
+        vector = _vectorize(stripped)
+        scores = sorted(
+            ((max(_cosine(vector, example) for example in vectors), agent)
+             for agent, vectors in self.example_vectors.items()),
+            reverse=True
+        )
+        if not scores:
+            return None
+
+        best_score, best_agent = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        if best_score >= self.threshold and best_score - runner_up >= self.margin:
+            return FastRoute(best_agent, best_score, f"similar to {best_agent} examples")
+        return None
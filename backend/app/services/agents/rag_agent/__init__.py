@@ -1,12 +1,18 @@
 import os
 import time
+import asyncio
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import List, Optional, Dict, Any
 
 from .vectorstore_weaviate import VectorStore
 from .reranker import Reranker
 from .query_expander import QueryExpander
 from .response_generator import ResponseGenerator
+from ..concurrency import retrieval_slots
 
 class DocumentRAG:
     """
@@ -26,12 +32,29 @@ class DocumentRAG:
         self.reranker = Reranker(config)
         self.query_expander = QueryExpander(config)
         self.response_generator = ResponseGenerator(config)
+        self._has_documents: Optional[bool] = None
+        self._has_documents_checked_at = 0.0
     
     def close(self):
         """Close connections and cleanup resources."""
         if hasattr(self.vector_store, 'close_conn'):
             self.vector_store.close_conn()
     
+    def has_documents(self, max_age: float = 60.0) -> bool:
+        """
+        Whether the knowledge base contains any chunk. The answer is cached for `max_age`
+        seconds; if Weaviate cannot be reached, documents are assumed to exist.
+        """
+        now = time.monotonic()
+        if self._has_documents is None or now - self._has_documents_checked_at > max_age:
+            try:
+                self._has_documents = self.vector_store.count_documents() > 0
+            except Exception as e:
+                self.logger.warning(f"Could not count documents: {e}")
+                self._has_documents = True
+            self._has_documents_checked_at = now
+        return self._has_documents
+    
     def ingest_directory(self, directory_path: str) -> Dict[str, Any]:
         """
         Ingest all text files in a directory into the RAG system. Assume files are pre-processed text.
@@ -66,24 +89,59 @@ class DocumentRAG:
             failed_ingestions = 0
             failed_files = []
             
-            for file_path in files:
-                self.logger.info(f"Processing file {successful_ingestions + failed_ingestions + 1}/{len(files)}: {file_path}")
-                
+            # Pipeline: chunk + embed trước tối đa `prefetch` file trong khi file trước đó đang được
+            # insert vào Weaviate (một luồng insert riêng), kết quả vẫn xử lý theo thứ tự file.
+            prefetch = max(1, getattr(self.config.rag, "ingest_prefetch_files", 4))
+            prepare_executor = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="ingest-prepare")
+            insert_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-insert")
+            pending_insert = None
+            
+            def finish_insert(pending) -> None:
+                nonlocal successful_ingestions, failed_ingestions, total_chunks_processed
+                file_path, future, chunk_count = pending
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        text_content = f.read()
-                    result = self.ingest_file(text_content, file_path)
-                    if result["success"]:
-                        successful_ingestions += 1
-                        total_chunks_processed += result.get("chunks_processed", 0)
-                    else:
-                        failed_ingestions += 1
-                        failed_files.append({"file": file_path, "error": result.get("error", "Unknown error")})
+                    future.result()
+                    successful_ingestions += 1
+                    total_chunks_processed += chunk_count
                 except Exception as e:
                     self.logger.error(f"Error processing file {file_path}: {e}")
                     failed_ingestions += 1
                     failed_files.append({"file": file_path, "error": str(e)})
             
+            try:
+                file_iter = iter(files)
+                window = deque(
+                    (file_path, prepare_executor.submit(self._prepare_file, file_path))
+                    for file_path in islice(file_iter, prefetch)
+                )
+                for index in range(len(files)):
+                    file_path, prepared = window.popleft()
+                    next_path = next(file_iter, None)
+                    if next_path is not None:
+                        window.append((next_path, prepare_executor.submit(self._prepare_file, next_path)))
+                    
+                    self.logger.info(f"Processing file {index + 1}/{len(files)}: {file_path}")
+                    try:
+                        doc_ids, data_objects = prepared.result()
+                    except Exception as e:
+                        self.logger.error(f"Error processing file {file_path}: {e}")
+                        failed_ingestions += 1
+                        failed_files.append({"file": file_path, "error": str(e)})
+                        continue
+                    
+                    if pending_insert:
+                        finish_insert(pending_insert)
+                    pending_insert = (file_path, insert_executor.submit(self.vector_store.insert_objects, data_objects), len(doc_ids))
+                
+                if pending_insert:
+                    finish_insert(pending_insert)
+            finally:
+                prepare_executor.shutdown(wait=True, cancel_futures=True)
+                insert_executor.shutdown(wait=True)
+            
+            if successful_ingestions:
+                self._has_documents = True
+            
             return {
                 "success": True,
                 "documents_ingested": successful_ingestions,
@@ -101,6 +159,15 @@ class DocumentRAG:
                 "processing_time": time.time() - start_time
             }
     
+    def _prepare_file(self, file_path: str):
+        """
+        Read, chunk and embed one text file. Returns (doc_ids, data_objects) ready to insert.
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text_content = f.read()
+        document_chunks = self.vector_store.chunk_document(text_content)
+        return self.vector_store.prepare_objects(document_chunks, file_path)
+    
     def ingest_file(self, text_content: str, document_path: str) -> Dict[str, Any]:
         """
         Ingest pre-processed text content into the RAG system.
@@ -125,6 +192,7 @@ class DocumentRAG:
                 document_chunks=document_chunks, 
                 document_path=document_path
             )
+            self._has_documents = True
             
             return {
                 "success": True,
@@ -141,6 +209,118 @@ class DocumentRAG:
                 "processing_time": time.time() - start_time
             }
         
+    def retrieve(self, query: str) -> Dict[str, Any]:
+        """
+        Run the retrieval half of the RAG pipeline (expand, retrieve, rerank).
+        
+        Args:
+            query: The query string
+            
+        Returns:
+            Dictionary with the expanded query, reranked documents, search type and confidence
+        """
+        self.logger.info(f"1. Expanding query: '{query}'")
+        expansion_result = self.query_expander.expand_query(query)
+        expanded_query = expansion_result["expanded_query"]
+        self.logger.info(f"   Original: '{query}'")
+        self.logger.info(f"   Expanded: '{expanded_query}'")
+        query = expanded_query
+
+        self.logger.info(f"2. Retrieving relevant documents for the query: '{query}'")
+        retrieved_documents = self.vector_store.retrieve_relevant_chunks(query=query)
+        search_type = retrieved_documents[0]["search_type"] if retrieved_documents else "none"
+        self.logger.info(f"   Retrieved {len(retrieved_documents)} relevant document chunks (search type: {search_type})")
+
+        self.logger.info(f"3. Reranking the retrieved documents")
+        if self.reranker and len(retrieved_documents) > 1:
+            reranked_documents, _ = self.reranker.rerank(query, retrieved_documents, "")
+            self.logger.info(f"   Reranked retrieved documents and chose top {len(reranked_documents)}")
+        else:
+            self.logger.info(f"   Could not rerank the retrieved documents, falling back to original scores")
+            reranked_documents = retrieved_documents
+
+        return {
+            "query": query,
+            "documents": reranked_documents,
+            "search_type": search_type,
+            "confidence": self.response_generator._calculate_confidence(reranked_documents)
+        }
+
+    async def aretrieve(self, query: str, expanded_query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Async version of retrieve(). LLM and embedding calls are awaited natively, the
+        blocking Weaviate query and cross-encoder reranking run in threads.
+        
+        Args:
+            query: The query string
+            expanded_query: Expansion already produced by the query planner; skips the expansion LLM call
+        """
+        if expanded_query:
+            self.logger.info(f"1. Using planned query expansion for: '{query}'")
+        else:
+            self.logger.info(f"1. Expanding query: '{query}'")
+            expansion_result = await self.query_expander.aexpand_query(query)
+            expanded_query = expansion_result["expanded_query"]
+        self.logger.info(f"   Original: '{query}'")
+        self.logger.info(f"   Expanded: '{expanded_query}'")
+        query = expanded_query
+
+        self.logger.info(f"2. Retrieving relevant documents for the query: '{query}'")
+        retrieved_documents = await self.vector_store.aretrieve_relevant_chunks(query=query)
+        search_type = retrieved_documents[0]["search_type"] if retrieved_documents else "none"
+        self.logger.info(f"   Retrieved {len(retrieved_documents)} relevant document chunks (search type: {search_type})")
+
+        self.logger.info(f"3. Reranking the retrieved documents")
+        if self.reranker and len(retrieved_documents) > 1:
+            async with retrieval_slots(self.config):
+                reranked_documents, _ = await asyncio.to_thread(self.reranker.rerank, query, retrieved_documents, "")
+            self.logger.info(f"   Reranked retrieved documents and chose top {len(reranked_documents)}")
+        else:
+            self.logger.info(f"   Could not rerank the retrieved documents, falling back to original scores")
+            reranked_documents = retrieved_documents
+
+        return {
+            "query": query,
+            "documents": reranked_documents,
+            "search_type": search_type,
+            "confidence": self.response_generator._calculate_confidence(reranked_documents)
+        }
+
+    def generate(self, retrieval: Dict[str, Any], chat_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """
+        Generate the answer for the result of retrieve().
+        
+        Args:
+            retrieval: Output of retrieve()
+            chat_history: Optional chat history for context
+            
+        Returns:
+            Response dictionary
+        """
+        self.logger.info("4. Generating response...")
+        response = self.response_generator.generate_response(
+            query=retrieval["query"],
+            retrieved_docs=retrieval["documents"],
+            picture_paths=[],
+            chat_history=chat_history
+        )
+        response["search_type"] = retrieval["search_type"]
+        return response
+
+    async def agenerate(self, retrieval: Dict[str, Any], chat_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """
+        Async version of generate().
+        """
+        self.logger.info("4. Generating response...")
+        response = await self.response_generator.agenerate_response(
+            query=retrieval["query"],
+            retrieved_docs=retrieval["documents"],
+            picture_paths=[],
+            chat_history=chat_history
+        )
+        response["search_type"] = retrieval["search_type"]
+        return response
+
     def process_query(self, query: str, chat_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
         """
         Process a query with the RAG system.
@@ -156,35 +336,9 @@ class DocumentRAG:
         self.logger.info(f"RAG Agent processing query: {query}")
         
         try:
-            self.logger.info(f"1. Expanding query: '{query}'")
-            expansion_result = self.query_expander.expand_query(query)
-            expanded_query = expansion_result["expanded_query"]
-            self.logger.info(f"   Original: '{query}'")
-            self.logger.info(f"   Expanded: '{expanded_query}'")
-            query = expanded_query
-
-            self.logger.info(f"2. Retrieving relevant documents for the query: '{query}'")
-            retrieved_documents = self.vector_store.retrieve_relevant_chunks(query=query)
-            self.logger.info(f"   Retrieved {len(retrieved_documents)} relevant document chunks (search type: {retrieved_documents[0]['search_type'] if retrieved_documents else 'none'})")
-
-            self.logger.info(f"3. Reranking the retrieved documents")
-            if self.reranker and len(retrieved_documents) > 1:
-                reranked_documents, _ = self.reranker.rerank(query, retrieved_documents, "")
-                self.logger.info(f"   Reranked retrieved documents and chose top {len(reranked_documents)}")
-            else:
-                self.logger.info(f"   Could not rerank the retrieved documents, falling back to original scores")
-                reranked_documents = retrieved_documents
-
-            self.logger.info("4. Generating response...")
-            response = self.response_generator.generate_response(
-                query=query,
-                retrieved_docs=reranked_documents,
-                picture_paths=[],
-                chat_history=chat_history
-            )
-            
+            retrieval = self.retrieve(query)
+            response = self.generate(retrieval, chat_history=chat_history)
             response["processing_time"] = time.time() - start_time
-            response["search_type"] = retrieved_documents[0]["search_type"] if retrieved_documents else "none"
             
             return response
         
@@ -198,4 +352,30 @@ class DocumentRAG:
                 "confidence": 0.0,
                 "processing_time": time.time() - start_time,
                 "search_type": "none"
-            }
\ No newline at end of file
+            }
+
+
+_shared_rag: Optional[DocumentRAG] = None
+_shared_rag_lock = threading.Lock()
+
+def get_document_rag(config) -> DocumentRAG:
+    """
+    Return the process-wide DocumentRAG, creating it on first use.
+
+    The instance is thread-safe: Weaviate access goes through its connection pool and the
+    reranker model is loaded once, so RAG queries do not pay connection and model cold-start.
+    """
+    global _shared_rag
+    if _shared_rag is None:
+        with _shared_rag_lock:
+            if _shared_rag is None:
+                _shared_rag = DocumentRAG(config)
+    return _shared_rag
+
+def close_document_rag() -> None:
+    """Close the process-wide DocumentRAG if it was created."""
+    global _shared_rag
+    with _shared_rag_lock:
+        if _shared_rag is not None:
+            _shared_rag.close()
+            _shared_rag = None
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe để giữ lượng token gửi lên API embedding dưới giới hạn (TPM).
+    - tokens_per_minute: Tốc độ nạp lại, 0 để không giới hạn.
+    - pause(): Chặn mọi worker trong một khoảng thời gian (khi API trả về 429).
+    """
+    def __init__(self, tokens_per_minute: int = 0):
+        self.rate = tokens_per_minute / 60.0
+        self.capacity = float(tokens_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        """Chờ đến khi đủ `tokens` (tối đa bằng capacity) rồi trừ đi."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if wait <= 0 and self.rate > 0:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    needed = min(float(tokens), self.capacity)
+                    if self.tokens >= needed:
+                        self.tokens -= needed
+                        return
+                    wait = (needed - self.tokens) / self.rate
+                elif wait <= 0:
+                    return
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _rate_limit_delay(error: Exception) -> Optional[float]:
+    """
+    Trả về số giây cần chờ nếu lỗi là 429 (0 nếu không có Retry-After), None nếu là lỗi khác.
+    """
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status_code != 429:
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+
+class BatchEmbedder:
+    """
+    Embed nhiều text bằng cách chia thành các batch và gửi song song, có throttling.
+    - batch_size: Số text mỗi request embed_documents.
+    - max_concurrency: Số request chạy đồng thời.
+    - tokens_per_minute: Giới hạn token ước lượng (~4 ký tự/token), 0 để không giới hạn.
+    - max_retries: Số lần thử lại khi API trả về 429 (chờ theo Retry-After hoặc backoff mũ).
+    """
+    def __init__(self, embedding_model: Any, batch_size: int = 64, max_concurrency: int = 4,
+                 tokens_per_minute: int = 0, max_retries: int = 5):
+        self.logger = logging.getLogger(__name__)
+        self.embedding_model = embedding_model
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(tokens_per_minute)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="embedding")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed `texts`, kết quả giữ đúng thứ tự đầu vào."""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._embed_batch(batches[0]) if batches else []
+        return [vector for batch in self._executor.map(self._embed_batch, batches) for vector in batch]
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        estimated_tokens = sum(len(text) // 4 + 1 for text in batch)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(estimated_tokens)
+            try:
+                return self.embedding_model.embed_documents(batch)
+            except Exception as e:
+                delay = _rate_limit_delay(e)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                delay = delay or min(60.0, 2.0 ** attempt)
+                self.logger.warning(f"Embedding API rate limited, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                # Mọi worker cùng chờ, tránh tiếp tục dồn request khi đã bị 429
+                self.bucket.pause(delay)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
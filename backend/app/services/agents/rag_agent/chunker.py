@@ -0,0 +1,185 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken đi kèm langchain-openai, nhưng vẫn chạy được nếu thiếu
+    tiktoken = None
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?。])\s+")
+APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+logger = logging.getLogger(__name__)
+
+# Ký tự nối một unit với unit đứng trước nó trong cùng chunk
+PARAGRAPH_SEPARATOR = "\n\n"
+LINE_SEPARATOR = "\n"
+WORD_SEPARATOR = " "
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """
+    Trả về hàm đếm token: dùng tiktoken nếu có, ngược lại ước lượng theo từ và dấu câu.
+    tiktoken tải file BPE ở lần get_encoding đầu tiên; nếu không tải được (không có mạng)
+    thì dùng hàm ước lượng. Kết quả được cache nên việc tải chỉ thử một lần mỗi process,
+    gọi hàm này lúc startup để không phải chờ tải ở lần chunk đầu tiên.
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.get_encoding(encoding_name)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding {encoding_name}, using approximate token counts: {e}")
+    return lambda text: len(APPROX_TOKEN_PATTERN.findall(text))
+
+
+class MarkdownChunker:
+    """
+    Chunk văn bản cục bộ (không gọi mạng), theo token và theo cấu trúc heading markdown.
+    - Mỗi section (heading + nội dung) được giữ nguyên nếu vừa chunk_size.
+    - Các section nhỏ liền nhau được gộp lại đến khi đầy chunk_size.
+    - Section lớn được chia theo đoạn, rồi theo dòng (giữ nguyên bảng, danh sách), rồi theo câu,
+      rồi theo từ; mỗi phần được gắn đường dẫn heading để giữ ngữ cảnh và chồng lấn
+      chunk_overlap token với phần trước.
+    """
+    def __init__(self, chunk_size: int = 512, chunk_overlap: int = 50,
+                 token_counter: Optional[Callable[[str], int]] = None):
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_overlap = max(0, min(chunk_overlap, self.chunk_size // 2))
+        self.count_tokens = token_counter or get_token_counter()
+
+    def split(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        buffer: List[str] = []
+        buffer_tokens = 0
+
+        for heading_path, section in self._sections(text):
+            section_tokens = self.count_tokens(section)
+            if section_tokens > self.chunk_size:
+                if buffer:
+                    chunks.append("\n\n".join(buffer))
+                    buffer, buffer_tokens = [], 0
+                chunks.extend(self._split_section(heading_path, section))
+                continue
+
+            if buffer and buffer_tokens + section_tokens > self.chunk_size:
+                chunks.append("\n\n".join(buffer))
+                buffer, buffer_tokens = [], 0
+            buffer.append(section)
+            buffer_tokens += section_tokens
+
+        if buffer:
+            chunks.append("\n\n".join(buffer))
+        return chunks
+
+    def _sections(self, text: str) -> List[Tuple[str, str]]:
+        """Tách văn bản theo heading, trả về (đường dẫn heading, nội dung section)."""
+        sections: List[Tuple[str, str]] = []
+        headings: List[Tuple[int, str]] = []
+        lines: List[str] = []
+        in_code_block = False
+
+        def flush():
+            section = "\n".join(lines).strip()
+            if section:
+                sections.append((" > ".join(title for _, title in headings), section))
+
+        for line in text.splitlines():
+            if line.lstrip().startswith("```"):
+                in_code_block = not in_code_block
+            match = None if in_code_block else HEADING_PATTERN.match(line)
+            if match:
+                flush()
+                lines = []
+                level = len(match.group(1))
+                headings = [(lvl, title) for lvl, title in headings if lvl < level]
+                headings.append((level, match.group(2)))
+            lines.append(line)
+        flush()
+        return sections
+
+    def _split_section(self, heading_path: str, section: str) -> List[str]:
+        prefix = f"{heading_path}\n" if heading_path else ""
+        budget = max(1, self.chunk_size - self.count_tokens(prefix))
+
+        # Mỗi unit là (ký tự nối với unit trước, nội dung)
+        units: List[Tuple[str, str]] = []
+        for paragraph in re.split(r"\n\s*\n", section):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if self.count_tokens(paragraph) <= budget:
+                units.append((PARAGRAPH_SEPARATOR, paragraph))
+                continue
+            for i, line in enumerate(paragraph.split("\n")):
+                separator = LINE_SEPARATOR if i else PARAGRAPH_SEPARATOR
+                if self.count_tokens(line) <= budget:
+                    units.append((separator, line))
+                else:
+                    units.extend(self._split_line(line, budget, separator))
+
+        chunks: List[List[Tuple[str, str]]] = []
+        current: List[Tuple[str, str]] = []
+        current_tokens = 0
+        for unit in units:
+            unit_tokens = self.count_tokens(unit[1])
+            if current and current_tokens + unit_tokens > budget:
+                chunks.append(current)
+                current, current_tokens = self._overlap_tail(current, budget - unit_tokens)
+            current.append(unit)
+            current_tokens += unit_tokens
+        if current:
+            chunks.append(current)
+
+        # Phần đầu tiên đã chứa heading của section, các phần sau được gắn đường dẫn heading
+        return [(prefix if i else "") + self._join_units(parts) for i, parts in enumerate(chunks)]
+
+    @staticmethod
+    def _join_units(units: List[Tuple[str, str]]) -> str:
+        """Nối các unit bằng ký tự nối của chúng; unit đầu tiên của chunk không cần ký tự nối."""
+        return units[0][1] + "".join(separator + text for separator, text in units[1:])
+
+    def _overlap_tail(self, units: List[Tuple[str, str]], budget: int) -> Tuple[List[Tuple[str, str]], int]:
+        """Lấy các unit cuối của chunk trước (tối đa chunk_overlap token) để lặp lại ở chunk sau."""
+        tail: List[Tuple[str, str]] = []
+        tokens = 0
+        limit = min(self.chunk_overlap, budget)
+        for unit in reversed(units):
+            unit_tokens = self.count_tokens(unit[1])
+            if tokens + unit_tokens > limit:
+                break
+            tail.insert(0, unit)
+            tokens += unit_tokens
+        return tail, tokens
+
+    def _split_line(self, line: str, budget: int, separator: str) -> List[Tuple[str, str]]:
+        """Chia một dòng quá dài theo câu; câu vẫn quá dài thì chia theo từ."""
+        units: List[Tuple[str, str]] = []
+        for i, sentence in enumerate(SENTENCE_PATTERN.split(line)):
+            sentence_separator = WORD_SEPARATOR if i else separator
+            if self.count_tokens(sentence) <= budget:
+                units.append((sentence_separator, sentence))
+                continue
+            for j, piece in enumerate(self._split_by_tokens(sentence, budget)):
+                units.append((WORD_SEPARATOR if j else sentence_separator, piece))
+        return units
+
+    def _split_by_tokens(self, text: str, budget: int) -> List[str]:
+        """Chia một câu quá dài theo từ, mỗi phần tối đa `budget` token."""
+        pieces: List[str] = []
+        words: List[str] = []
+        tokens = 0
+        for word in text.split():
+            word_tokens = self.count_tokens(word)
+            if words and tokens + word_tokens > budget:
+                pieces.append(" ".join(words))
+                words, tokens = [], 0
+            words.append(word)
+            tokens += word_tokens
+        if words:
+            pieces.append(" ".join(words))
+        return pieces
@@ -1,6 +1,8 @@
 import logging
 from typing import List, Dict, Any
 
+from ..concurrency import llm_slots
+
 class QueryExpander:
     """
     Expands user queries with relevant terminology to improve retrieval.
@@ -30,9 +32,26 @@ class QueryExpander:
             "expanded_query": expanded_query.content
         }
     
+    async def aexpand_query(self, original_query: str) -> Dict[str, Any]:
+        """Async version of expand_query."""
+        self.logger.info(f"Expanding query: {original_query}")
+        
+        async with llm_slots(self.config):
+            expanded_query = await self.model.ainvoke(self._build_expansion_prompt(original_query))
+        
+        return {
+            "original_query": original_query,
+            "expanded_query": expanded_query.content
+        }
+    
     def _generate_expansions(self, query: str) -> str:
         """Use LLM to expand query with relevant terminology."""
-        prompt = f"""
+        expansion = self.model.invoke(self._build_expansion_prompt(query))
+        
+        return expansion
+
+    def _build_expansion_prompt(self, query: str) -> str:
+        return f"""
         Expand the following query with relevant terminology, synonyms, and related concepts that would help in retrieving relevant information:
 
         User Query: {query}
@@ -41,7 +60,4 @@ class QueryExpander:
         Be specific to the domain mentioned in the user query, do not add unrelated domains.
         If the user query asks about answering in tabular format, include that in the expanded query and do not answer in tabular format yourself.
         Provide only the expanded query without explanations.
-        """
-        expansion = self.model.invoke(prompt)
-        
-        return expansion
\ No newline at end of file
+        """
\ No newline at end of file
@@ -1,10 +1,21 @@
 import os
 import re
 import logging
+import threading
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 from sentence_transformers import CrossEncoder
 
+_models: Dict[str, CrossEncoder] = {}
+_models_lock = threading.Lock()
+
+def _load_cross_encoder(model_name: str) -> CrossEncoder:
+    """Load a cross-encoder once per process and share it between Reranker instances."""
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = CrossEncoder(model_name)
+        return _models[model_name]
+
 class Reranker:
     """
     Reranks retrieved documents using a cross-encoder model for more accurate results.
@@ -20,7 +31,7 @@ class Reranker:
         try:
             self.model_name = config.rag.reranker_model
             self.logger.info(f"Loading reranker model: {self.model_name}")
-            self.model = CrossEncoder(self.model_name)
+            self.model = _load_cross_encoder(self.model_name)
             self.top_k = config.rag.reranker_top_k
         except Exception as e:
             self.logger.error(f"Error loading reranker model: {e}")
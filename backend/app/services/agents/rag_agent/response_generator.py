@@ -1,6 +1,8 @@
 import logging
 from typing import List, Dict, Any, Optional, Union
 
+from ..concurrency import llm_slots
+
 class ResponseGenerator:
     """
     Generates responses based on retrieved context and user query.
@@ -14,6 +16,7 @@ class ResponseGenerator:
             llm: Large language model for response generation
         """
         self.logger = logging.getLogger(__name__)
+        self.config = config
         self.response_generator_model = config.rag.response_generator_model
         self.include_sources = getattr(config.rag, "include_sources", True)
 
@@ -109,56 +112,66 @@ class ResponseGenerator:
             Dict containing response text and source information
         """
         try:
-           
-            # Extract content from documents for context
-            doc_texts = [doc["content"] for doc in retrieved_docs]
-            
-            # Combine retrieved documents into a single context
-            context = "\n\n===DOCUMENT SECTION===\n\n".join(doc_texts)
-            
-            # Build the prompt
-            prompt = self._build_prompt(query, context, chat_history)
-            
-            # Generate response
-            response = self.response_generator_model.invoke(prompt)
-            
-            # Extract sources for citation
-            sources = self._extract_sources(retrieved_docs) if hasattr(self, 'include_sources') and self.include_sources else []
-            
-            # Calculate confidence
-            confidence = self._calculate_confidence(retrieved_docs)
-
-            # Add sources to response
-            # if hasattr(self, 'include_sources') and self.include_sources:
-            #     response_with_source = response.content + "\n\n##### Source documents:"
-            #     for current_source in sources:
-            #         source_path = current_source['path']
-            #         source_title = current_source['title']
-            #         response_with_source += f"\n- [{source_title}]({source_path})"
-            # else:
-            #     response_with_source = response.content
-            
-            # # Add picture paths to response
-            # response_with_source_and_picture_paths = response_with_source + "\n\n##### Reference images:"
-            # for picture_path in picture_paths:
-            #     response_with_source_and_picture_paths += f"\n- [{picture_path.split('/')[-1]}]({picture_path})"
-            
-            # Format final response
-            result = {
-                "response": response.content,
-                "sources": sources,
-                "confidence": confidence
-            }
+            prompt = self._build_prompt(query, self._build_context(retrieved_docs), chat_history)
+            
+            # Generate response (tagged so the agent graph can stream its tokens)
+            response = self.response_generator_model.invoke(prompt, config={"tags": ["rag_response"]})
             
-            return result
+            return self._format_result(response, retrieved_docs)
             
         except Exception as e:
             self.logger.error(f"Error generating response: {e}")
-            return {
-                "response": "I apologize, but I encountered an error while generating a response. Please try rephrasing your question.",
-                "sources": [],
-                "confidence": 0.0
-            }
+            return self._error_result()
+
+    async def agenerate_response(
+            self,
+            query: str,
+            retrieved_docs: List[Dict[str, Any]],
+            picture_paths: List[str],
+            chat_history: Optional[List[Dict[str, str]]] = None,
+        ) -> Dict[str, Any]:
+        """
+        Async version of generate_response.
+        """
+        try:
+            prompt = self._build_prompt(query, self._build_context(retrieved_docs), chat_history)
+            
+            async with llm_slots(self.config):
+                response = await self.response_generator_model.ainvoke(prompt, config={"tags": ["rag_response"]})
+            
+            return self._format_result(response, retrieved_docs)
+            
+        except Exception as e:
+            self.logger.error(f"Error generating response: {e}")
+            return self._error_result()
+
+    def _build_context(self, retrieved_docs: List[Dict[str, Any]]) -> str:
+        """Combine retrieved documents into a single context."""
+        # Extract content from documents for context
+        doc_texts = [doc["content"] for doc in retrieved_docs]
+        
+        return "\n\n===DOCUMENT SECTION===\n\n".join(doc_texts)
+
+    def _format_result(self, response, retrieved_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the response dictionary from the LLM response."""
+        # Extract sources for citation
+        sources = self._extract_sources(retrieved_docs) if hasattr(self, 'include_sources') and self.include_sources else []
+        
+        # Calculate confidence
+        confidence = self._calculate_confidence(retrieved_docs)
+        
+        return {
+            "response": response.content,
+            "sources": sources,
+            "confidence": confidence
+        }
+
+    def _error_result(self) -> Dict[str, Any]:
+        return {
+            "response": "I apologize, but I encountered an error while generating a response. Please try rephrasing your question.",
+            "sources": [],
+            "confidence": 0.0
+        }
 
     def _extract_sources(self, documents: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         """
@@ -1,16 +1,33 @@
+import asyncio
+import hashlib
 import logging
 import os
-from typing import List, Dict, Any, Tuple, Optional
-from uuid import uuid4
-from weaviate.classes.init import Auth
+import re
+from typing import List, Dict, Any, Tuple
 from weaviate.classes.data import DataObject
+from weaviate.classes.query import Filter
 
 import weaviate
-from langchain_core.documents import Document
-from langchain_openai import AzureOpenAIEmbeddings
 from weaviate.collections.classes.config import Configure
 from weaviate.util import generate_uuid5
 
+from .weaviate_pool import WeaviateClientPool
+from .batch_embedder import BatchEmbedder
+from .chunker import MarkdownChunker
+from ..concurrency import retrieval_slots
+from app.services.embedding_cache import get_embedding_cache, normalize_text
+
+CHUNKING_PROMPT = """
+You are an assistant specialized in splitting text into thematically consistent sections.
+The text has been divided into chunks, each marked with <|start_chunk_X|> and <|end_chunk_X|> tags, where X is the chunk number.
+Your task is to identify the points where splits should occur, such that consecutive chunks of similar themes stay together.
+Respond with a list of chunk IDs where you believe a split should be made. For example, if chunks 1 and 2 belong together but chunk 3 starts a new topic, you would suggest a split after chunk 2.
+THE CHUNKS MUST BE IN ASCENDING ORDER.
+Your response should be in the form: 'split_after: 3, 5'.
+
+{document_text}
+""".strip()
+
 
 class VectorStore:
     """
@@ -27,146 +44,256 @@ class VectorStore:
         self.use_hybrid_search = getattr(config.rag, "use_hybrid_search", True)  # Thêm cấu hình hybrid search
         self.hybrid_alpha = getattr(config.rag, "hybrid_alpha", 0.5)  # Trọng số giữa BM25 và semantic (0: chỉ BM25, 1: chỉ semantic)
 
-        # Kết nối Weaviate client
-        self.client = weaviate.connect_to_weaviate_cloud(
-            auth_credentials=Auth.api_key(api_key=self.weaviate_api_key) if self.weaviate_api_key else None,
-            cluster_url=self.weaviate_url
+        self.chunking_strategy = getattr(config.rag, "chunking_strategy", "local")
+        self.chunker = MarkdownChunker(chunk_size=config.rag.chunk_size, chunk_overlap=config.rag.chunk_overlap)
+        # Chế độ "llm": các phần nhỏ không chồng lấn, LLM chỉ quyết định cách gộp
+        self.semantic_chunker = MarkdownChunker(
+            chunk_size=config.rag.chunk_size, chunk_overlap=0, token_counter=self.chunker.count_tokens
+        )
+        self.embedder = BatchEmbedder(
+            self.embedding_model,
+            batch_size=getattr(config.rag, "embedding_batch_size", 64),
+            max_concurrency=getattr(config.rag, "embedding_max_concurrency", 4),
+            tokens_per_minute=getattr(config.rag, "embedding_tokens_per_minute", 0),
+            max_retries=getattr(config.rag, "embedding_max_retries", 5)
+        )
+
+        # Pool kết nối Weaviate, dùng lại giữa các query thay vì kết nối mới mỗi lần
+        self.pool = WeaviateClientPool(
+            cluster_url=self.weaviate_url,
+            api_key=self.weaviate_api_key,
+            size=getattr(config.rag, "weaviate_pool_size", 4)
         )
         
         # Tạo schema nếu chưa tồn tại
-        if not self.client.collections.exists(self.collection_name):
-            self.client.collections.create(
-                name=self.collection_name,
-                vectorizer_config=Configure.Vectorizer.none(),
-                properties=[
-                    weaviate.classes.config.Property(
-                        name="content",
-                        data_type=weaviate.classes.config.DataType.TEXT
-                    ),
-                    weaviate.classes.config.Property(
-                        name="source",
-                        data_type=weaviate.classes.config.DataType.TEXT
-                    ),
-                    weaviate.classes.config.Property(
-                        name="doc_id",
-                        data_type=weaviate.classes.config.DataType.TEXT
-                    ),
-                    weaviate.classes.config.Property(
-                        name="user_id",
-                        data_type=weaviate.classes.config.DataType.TEXT
-                    ),
-                ]
-            )
-            self.logger.info(f"Tạo class mới trong Weaviate: {self.collection_name}")
+        with self.pool.connection() as client:
+            if not client.collections.exists(self.collection_name):
+                client.collections.create(
+                    name=self.collection_name,
+                    vectorizer_config=Configure.Vectorizer.none(),
+                    properties=[
+                        weaviate.classes.config.Property(
+                            name="content",
+                            data_type=weaviate.classes.config.DataType.TEXT
+                        ),
+                        weaviate.classes.config.Property(
+                            name="source",
+                            data_type=weaviate.classes.config.DataType.TEXT
+                        ),
+                        weaviate.classes.config.Property(
+                            name="doc_id",
+                            data_type=weaviate.classes.config.DataType.TEXT
+                        ),
+                        weaviate.classes.config.Property(
+                            name="user_id",
+                            data_type=weaviate.classes.config.DataType.TEXT
+                        ),
+                    ]
+                )
+                self.logger.info(f"Tạo class mới trong Weaviate: {self.collection_name}")
 
     def close_conn(self):
-        self.client.close()
+        self.pool.close()
+        self.embedder.close()
+
+    def count_documents(self) -> int:
+        """
+        Đếm số chunk hiện có trong collection.
+        """
+        with self.pool.connection() as client:
+            collection = client.collections.get(self.collection_name)
+            return collection.aggregate.over_all(total_count=True).total_count or 0
 
     def chunk_document(self, formatted_document: str) -> List[str]:
         """
-        Chunk text đã sẵn thành các đoạn nhỏ (di chuyển từ content_processor.py).
+        Chunk text đã sẵn thành các đoạn nhỏ theo heading markdown và số token.
+        Với chunking_strategy = "llm", chunker_model quyết định gộp các phần liền nhau cùng chủ đề.
         """
-        SPLIT_PATTERN = "\n#"
-        chunks = formatted_document.split(SPLIT_PATTERN)
-        
-        chunked_text = ""
-        for i, chunk in enumerate(chunks):
-            if chunk.startswith("#"):
-                chunk = f"#{chunk}"
-            chunked_text += f"<|start_chunk_{i}|>\n{chunk}\n<|end_chunk_{i}|>\n"
-        
-        CHUNKING_PROMPT = """
-        # Prompt giống cũ, bỏ phần image
-        """.strip()
+        if self.chunking_strategy != "llm":
+            return self.chunker.split(formatted_document)
         
+        sections = self.semantic_chunker.split(formatted_document)
+        if len(sections) <= 1:
+            return sections
+        try:
+            return self._merge_semantic_sections(sections)
+        except Exception as e:
+            self.logger.warning(f"LLM chunking thất bại, dùng chunk local: {e}")
+            return self.chunker.split(formatted_document)
+
+    def _merge_semantic_sections(self, sections: List[str]) -> List[str]:
+        """
+        Hỏi chunker_model nên tách sau những section nào, rồi gộp các section còn lại
+        (mỗi chunk gộp tối đa 2 * chunk_size token).
+        """
+        chunked_text = "".join(
+            f"<|start_chunk_{i}|>\n{section}\n<|end_chunk_{i}|>\n" for i, section in enumerate(sections)
+        )
         formatted_chunking_prompt = CHUNKING_PROMPT.format(document_text=chunked_text)
         chunking_response = self.config.rag.chunker_model.invoke(formatted_chunking_prompt).content
         
+        match = re.search(r"split_after:\s*([\d,\s]*)", chunking_response, re.IGNORECASE)
+        if not match:
+            raise ValueError(f"Không đọc được kết quả chunking: {chunking_response[:200]}")
+        split_after = {int(i) for i in re.findall(r"\d+", match.group(1))}
+        
+        max_tokens = 2 * self.chunker.chunk_size
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for i, section in enumerate(sections):
+            section_tokens = self.chunker.count_tokens(section)
+            if current and current_tokens + section_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(section)
+            current_tokens += section_tokens
+            if i in split_after:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+        if current:
+            chunks.append("\n\n".join(current))
         return chunks
 
     def create_vectorstore(self, document_chunks: List[str], document_path: str) -> Tuple[Any, List[str]]:
         """
         Ingest chunks text đã sẵn vào Weaviate.
         """
-        doc_ids = [str(uuid4()) for _ in range(len(document_chunks))]
+        doc_ids, data_objects = self.prepare_objects(document_chunks, document_path)
+        self.insert_objects(data_objects)
+        return self.pool, doc_ids
+
+    def prepare_objects(self, document_chunks: List[str], document_path: str) -> Tuple[List[str], List[DataObject]]:
+        """
+        Tạo DataObject (id + embedding) cho các chunk chưa có trong Weaviate.
+        Id của mỗi chunk là uuid5 của (hash nội dung tài liệu, nội dung chunk), không phụ thuộc
+        document_path (presigned URL đổi theo mỗi lần upload), nên upload lại cùng một file không
+        tạo bản trùng: chunk đã có trong Weaviate được bỏ qua, chunk đã từng embed lấy vector từ cache.
+        """
+        source = os.path.basename(document_path)
+        document_hash = hashlib.sha256(
+            "\x00".join(normalize_text(chunk) for chunk in document_chunks).encode("utf-8")
+        ).hexdigest()
+        chunks_by_id: Dict[str, str] = {}
+        for chunk in document_chunks:
+            chunks_by_id.setdefault(generate_uuid5(normalize_text(chunk), document_hash), chunk)
+        doc_ids = list(chunks_by_id)
         
-        langchain_documents = []
-        for id_idx, chunk in enumerate(document_chunks):
-            langchain_documents.append(
-                Document(
-                    page_content=chunk,
-                    metadata={
-                        "source": os.path.basename(document_path),
-                        "doc_id": doc_ids[id_idx],
-                    }
-                )
-            )
+        with self.pool.connection() as client:
+            collection = client.collections.get(self.collection_name)
+            existing_ids = self._existing_ids(collection, doc_ids)
         
-        embeddings = self.embedding_model.embed_documents([doc.page_content for doc in langchain_documents])
+        new_ids = [doc_id for doc_id in doc_ids if doc_id not in existing_ids]
+        if not new_ids:
+            self.logger.info(f"Tất cả {len(doc_ids)} chunks của {source} đã có trong Weaviate, bỏ qua")
+            return doc_ids, []
         
-        collection = self.client.collections.get(self.collection_name)
+        new_chunks = [chunks_by_id[doc_id] for doc_id in new_ids]
+        embeddings = get_embedding_cache().embed_documents(
+            self.embedding_model, new_chunks, embed_fn=self.embedder.embed_documents
+        )
         
         data_objects = []
-        for i, doc in enumerate(langchain_documents):
+        for doc_id, chunk, embedding in zip(new_ids, new_chunks, embeddings):
             data_objects.append(
                 DataObject(
                     properties={
-                        "content": doc.page_content,
-                        "source": doc.metadata["source"],
-                        "doc_id": doc.metadata["doc_id"],
+                        "content": chunk,
+                        "source": source,
+                        "doc_id": doc_id,
                     },
-                    vector=embeddings[i]
+                    uuid=doc_id,
+                    vector=embedding
                 )
             )
+        return doc_ids, data_objects
+
+    def insert_objects(self, data_objects: List[DataObject]) -> None:
+        """
+        Insert các DataObject đã có embedding vào Weaviate.
+        """
+        if not data_objects:
+            return
+        with self.pool.connection() as client:
+            collection = client.collections.get(self.collection_name)
+            collection.data.insert_many(data_objects)
         
-        collection.data.insert_many(data_objects)
-        
-        self.logger.info(f"Đã ingest {len(document_chunks)} chunks vào Weaviate")
-        return self.client, doc_ids
+        self.logger.info(f"Đã ingest {len(data_objects)} chunks vào Weaviate")
+
+    def _existing_ids(self, collection, doc_ids: List[str], batch_size: int = 100) -> set:
+        """
+        Trả về các id trong doc_ids đã tồn tại trong collection.
+        """
+        existing_ids = set()
+        for start in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[start:start + batch_size]
+            response = collection.query.fetch_objects(
+                filters=Filter.by_id().contains_any(batch),
+                limit=len(batch),
+                return_properties=[]
+            )
+            existing_ids.update(str(obj.uuid) for obj in response.objects)
+        return existing_ids
 
     def retrieve_relevant_chunks(self, query: str) -> List[Dict[str, Any]]:
         """
         Retrieve từ Weaviate dựa trên query, hỗ trợ hybrid search (BM25 + semantic).
         """
-        query_embedding = self.embedding_model.embed_query(query)
-        collection = self.client.collections.get(self.collection_name)
-        
+        query_embedding = get_embedding_cache().embed_query(self.embedding_model, query)
+        return self._search(query, query_embedding)
+
+    async def aretrieve_relevant_chunks(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Async version của retrieve_relevant_chunks: embed query bằng API async,
+        truy vấn Weaviate (client sync) trong thread, giới hạn bởi retrieval semaphore.
+        """
+        query_embedding = await get_embedding_cache().aembed_query(self.embedding_model, query)
+        async with retrieval_slots(self.config):
+            return await asyncio.to_thread(self._search, query, query_embedding)
+
+    def _search(self, query: str, query_embedding: List[float]) -> List[Dict[str, Any]]:
+        """
+        Truy vấn Weaviate với embedding đã có (hybrid hoặc semantic).
+        """
         retrieved_docs = []
         
-        if self.use_hybrid_search:
-            # Thực hiện hybrid search (kết hợp BM25 và semantic)
-            response = collection.query.hybrid(
-                query=query,
-                vector=query_embedding,
-                alpha=self.hybrid_alpha,  # Trọng số giữa BM25 (0) và semantic (1)
-                limit=self.retrieval_top_k,
-                return_metadata=['distance', 'score']
-            )
-            for hit in response.objects:
-                doc_dict = {
-                    "id": hit.properties.get("doc_id", ""),
-                    "content": hit.properties.get("content", ""),
-                    "source": hit.properties.get("source", ""),
-                    "score": hit.metadata.score if hit.metadata and hasattr(hit.metadata, 'score') else 0.0,
-                    "search_type": "hybrid"  # Ghi nhận loại tìm kiếm
-                }
-                retrieved_docs.append(doc_dict)
-        else:
-            # Chỉ sử dụng semantic search (như cũ)
-            response = collection.query.near_vector(
-                near_vector=query_embedding,
-                limit=self.retrieval_top_k,
-                return_metadata=['distance']
-            )
-            for hit in response.objects:
-                doc_dict = {
-                    "id": hit.properties.get("doc_id", ""),
-                    "content": hit.properties.get("content", ""),
-                    "source": hit.properties.get("source", ""),
-                    "score": hit.metadata.distance if hit.metadata and hasattr(hit.metadata, 'distance') else 0.0,
-                    "search_type": "semantic"
-                }
-                retrieved_docs.append(doc_dict)
+        with self.pool.connection() as client:
+            collection = client.collections.get(self.collection_name)
+            
+            if self.use_hybrid_search:
+                # Thực hiện hybrid search (kết hợp BM25 và semantic)
+                response = collection.query.hybrid(
+                    query=query,
+                    vector=query_embedding,
+                    alpha=self.hybrid_alpha,  # Trọng số giữa BM25 (0) và semantic (1)
+                    limit=self.retrieval_top_k,
+                    return_metadata=['distance', 'score']
+                )
+                for hit in response.objects:
+                    doc_dict = {
+                        "id": hit.properties.get("doc_id", ""),
+                        "content": hit.properties.get("content", ""),
+                        "source": hit.properties.get("source", ""),
+                        "score": hit.metadata.score if hit.metadata and hasattr(hit.metadata, 'score') else 0.0,
+                        "search_type": "hybrid"  # Ghi nhận loại tìm kiếm
+                    }
+                    retrieved_docs.append(doc_dict)
+            else:
+                # Chỉ sử dụng semantic search (như cũ)
+                response = collection.query.near_vector(
+                    near_vector=query_embedding,
+                    limit=self.retrieval_top_k,
+                    return_metadata=['distance']
+                )
+                for hit in response.objects:
+                    doc_dict = {
+                        "id": hit.properties.get("doc_id", ""),
+                        "content": hit.properties.get("content", ""),
+                        "source": hit.properties.get("source", ""),
+                        "score": hit.metadata.distance if hit.metadata and hasattr(hit.metadata, 'distance') else 0.0,
+                        "search_type": "semantic"
+                    }
+                    retrieved_docs.append(doc_dict)
         
         self.logger.info(f"Retrieved {len(retrieved_docs)} documents using {'hybrid' if self.use_hybrid_search else 'semantic'} search")
         return retrieved_docs
\ No newline at end of file
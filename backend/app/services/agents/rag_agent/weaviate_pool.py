@@ -0,0 +1,77 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import weaviate
+from weaviate.classes.init import Auth
+
+
+class WeaviateClientPool:
+    """
+    Thread-safe pool of Weaviate cloud connections.
+
+    Connections are opened lazily, at most `size` are in use at the same time, and idle
+    ones are reused by later callers instead of reconnecting for every query.
+    """
+    def __init__(self, cluster_url: str, api_key: Optional[str], size: int = 4):
+        self.logger = logging.getLogger(__name__)
+        self.cluster_url = cluster_url
+        self.api_key = api_key
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[weaviate.WeaviateClient]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def _connect(self) -> weaviate.WeaviateClient:
+        self.logger.info(f"Opening Weaviate connection to {self.cluster_url}")
+        return weaviate.connect_to_weaviate_cloud(
+            auth_credentials=Auth.api_key(api_key=self.api_key) if self.api_key else None,
+            cluster_url=self.cluster_url
+        )
+
+    @contextmanager
+    def connection(self) -> Iterator[weaviate.WeaviateClient]:
+        """Borrow a connection for the duration of the `with` block."""
+        if self._closed:
+            raise RuntimeError("Weaviate connection pool is closed")
+
+        self._slots.acquire()
+        try:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                client = self._connect()
+
+            try:
+                yield client
+            except Exception:
+                # The connection may be broken, do not hand it out again
+                self._close_client(client)
+                client = None
+                raise
+            finally:
+                if client is not None:
+                    if self._closed:
+                        self._close_client(client)
+                    else:
+                        self._idle.put(client)
+        finally:
+            self._slots.release()
+
+    def _close_client(self, client: weaviate.WeaviateClient) -> None:
+        try:
+            client.close()
+        except Exception as e:
+            self.logger.warning(f"Error closing Weaviate connection: {e}")
+
+    def close(self) -> None:
+        """Close all idle connections; connections in use are closed when returned."""
+        self._closed = True
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_client(client)
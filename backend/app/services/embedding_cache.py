@@ -0,0 +1,171 @@
+# embedding_cache.py
+# Cache embedding của query và của chunk khi ingest, dùng chung cho VectorStore (Weaviate)
+# và RAGPipelineService.
+# Tầng 1: LRU trong bộ nhớ. Tầng 2 (tùy chọn): sqlite trên đĩa, giữ lại qua các lần restart.
+# Key = tên model + text đã chuẩn hóa, nên đổi model sẽ không dùng nhầm vector cũ.
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.cache_service import LRUCache
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa Unicode (NFC) và khoảng trắng để các query giống nhau dùng chung một key."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embedding_model_name(embedding_model: Any) -> str:
+    """Tên định danh của một embedding model LangChain (Azure deployment, HuggingFace model...)."""
+    for attribute in ("deployment", "model", "model_name"):
+        name = getattr(embedding_model, attribute, None)
+        if isinstance(name, str) and name:
+            return name
+    return type(embedding_model).__name__
+
+
+class EmbeddingCache:
+    """
+    Cache embedding hai tầng, thread-safe.
+    - max_size / ttl: Cấu hình LRU trong bộ nhớ.
+    - db_path: Đường dẫn file sqlite, None để chỉ dùng bộ nhớ.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: Optional[float] = None, db_path: Optional[str] = None):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            with self._db_lock, self._db:
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name: str, text: str) -> Optional[List[float]]:
+        """Tìm embedding trong bộ nhớ, sau đó trong sqlite (và đưa lại vào bộ nhớ)."""
+        key = self.make_key(model_name, text)
+        vector = self.memory.get(key)
+        if vector is not None or self._db is None:
+            return vector
+        return self._load(key)
+
+    def _load(self, key: str) -> Optional[List[float]]:
+        """Đọc embedding từ sqlite và đưa lại vào bộ nhớ."""
+        with self._db_lock:
+            row = self._db.execute("SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        blob, created_at = row
+        if self.ttl and created_at + self.ttl <= time.time():
+            return None
+
+        vector = array("d", blob).tolist()
+        self.memory.set(key, vector)
+        return vector
+
+    def set(self, model_name: str, text: str, vector: List[float]) -> None:
+        key = self.make_key(model_name, text)
+        vector = list(vector)
+        self.memory.set(key, vector)
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, array("d", vector).tobytes(), time.time())
+                )
+
+    def embed_query(self, embedding_model: Any, text: str) -> List[float]:
+        """embedding_model.embed_query(text), trả về kết quả đã cache nếu có."""
+        model_name = embedding_model_name(embedding_model)
+        vector = self.get(model_name, text)
+        if vector is None:
+            vector = embedding_model.embed_query(text)
+            self.set(model_name, text, vector)
+        return vector
+
+    async def aembed_query(self, embedding_model: Any, text: str) -> List[float]:
+        """Async version của embed_query, dùng embedding_model.aembed_query khi cache miss."""
+        model_name = embedding_model_name(embedding_model)
+        key = self.make_key(model_name, text)
+        vector = self.memory.get(key)
+        # Truy cập sqlite chạy trong thread để không chặn event loop
+        if vector is None and self._db is not None:
+            vector = await asyncio.to_thread(self._load, key)
+        if vector is None:
+            vector = await embedding_model.aembed_query(text)
+            if self._db is not None:
+                await asyncio.to_thread(self.set, model_name, text, vector)
+            else:
+                self.set(model_name, text, vector)
+        return vector
+
+    def embed_documents(self, embedding_model: Any, texts: List[str],
+                        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None) -> List[List[float]]:
+        """
+        embedding_model.embed_documents(texts), chỉ gửi các text chưa có trong cache
+        (mỗi text khác nhau gửi một lần) và lưu kết quả vào cache.
+        embed_fn: Hàm embed thay thế cho embedding_model.embed_documents (vd. BatchEmbedder).
+        """
+        model_name = embedding_model_name(embedding_model)
+        vectors: List[Optional[List[float]]] = [self.get(model_name, text) for text in texts]
+        # key (text đã chuẩn hóa) -> text gốc: chỉ key được chuẩn hóa, API nhận nguyên văn chunk
+        missing: Dict[str, str] = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                missing.setdefault(self.make_key(model_name, text), text)
+        if missing:
+            embedded = dict(zip(missing, (embed_fn or embedding_model.embed_documents)(list(missing.values()))))
+            for key, text in missing.items():
+                self.set(model_name, text, embedded[key])
+            vectors = [vector if vector is not None else embedded[self.make_key(model_name, text)]
+                       for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats["db_path"] = self.db_path
+        return stats
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Trả về EmbeddingCache dùng chung cho cả process, khởi tạo lần đầu từ EmbeddingCacheConfig."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                from app.config import EmbeddingCacheConfig
+                cache_config = EmbeddingCacheConfig()
+                _embedding_cache = EmbeddingCache(
+                    max_size=cache_config.max_size,
+                    ttl=cache_config.ttl,
+                    db_path=cache_config.db_path
+                )
+    return _embedding_cache
@@ -0,0 +1,160 @@
+# extraction_cache.py
+# Cache text đã extract theo nội dung file: cùng một file (upload bởi nhiều người dùng,
+# hoặc upload lại) chỉ phải extract một lần.
+# Key = SHA-256 của bytes file + phiên bản extractor + định dạng, nên đổi model / cấu hình
+# extract sẽ không dùng nhầm kết quả cũ.
+# Backend: thư mục local, hoặc MinIO dưới một prefix riêng (dùng chung giữa các worker).
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 của nội dung file, đọc theo từng khối để không giữ cả file trong bộ nhớ."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_cache_key(content_hash: str, extractor_version: str, file_format: str) -> str:
+    return hashlib.sha256(f"{content_hash}\x00{extractor_version}\x00{file_format.lower()}".encode("utf-8")).hexdigest()
+
+
+class LocalCacheBackend:
+    """Lưu mỗi entry thành một file text trong `directory` (chia thư mục con theo 2 ký tự đầu của key)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, text: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Ghi ra file tạm rồi rename để process khác không đọc phải entry ghi dở
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class MinioCacheBackend:
+    """Lưu mỗi entry thành object `<prefix><key>.txt` trong bucket của minio_service."""
+
+    def __init__(self, prefix: str = "extraction-cache/"):
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        from minio.error import S3Error
+        from app.services.minio_service import minio_client, MINIO_BUCKET
+
+        try:
+            response = minio_client.get_object(MINIO_BUCKET, f"{self.prefix}{key}.txt")
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return response.read().decode("utf-8")
+        finally:
+            response.close()
+            response.release_conn()
+
+    def set(self, key: str, text: str) -> None:
+        from app.services.minio_service import minio_client, MINIO_BUCKET
+
+        data = text.encode("utf-8")
+        minio_client.put_object(
+            MINIO_BUCKET,
+            f"{self.prefix}{key}.txt",
+            io.BytesIO(data),
+            length=len(data),
+            content_type="text/plain; charset=utf-8"
+        )
+
+
+class ExtractionCache:
+    """
+    Cache kết quả extract theo nội dung file. backend=None để tắt cache.
+    Lỗi của backend chỉ được ghi log: cache không bao giờ làm hỏng việc extract.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        try:
+            text = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed: {e}")
+            text = None
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    def set(self, key: str, text: str) -> None:
+        # Không cache kết quả rỗng để lần sau còn thử extract lại
+        if self.backend is None or not text:
+            return
+        try:
+            self.backend.set(key, text)
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed: {e}")
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+
+_extraction_cache: Optional[ExtractionCache] = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Trả về ExtractionCache dùng chung cho cả process, khởi tạo lần đầu từ ExtractionConfig."""
+    global _extraction_cache
+    if _extraction_cache is None:
+        with _extraction_cache_lock:
+            if _extraction_cache is None:
+                from app.config import ExtractionConfig
+                extraction_config = ExtractionConfig()
+                backend = None
+                if extraction_config.cache_backend == "local":
+                    backend = LocalCacheBackend(extraction_config.cache_dir)
+                elif extraction_config.cache_backend == "minio":
+                    backend = MinioCacheBackend(extraction_config.cache_prefix)
+                _extraction_cache = ExtractionCache(backend)
+    return _extraction_cache
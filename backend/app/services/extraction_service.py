@@ -1,62 +1,282 @@
 import os
 import tempfile
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import time
+import io
+from typing import Dict, List, Optional, Set, Tuple, Union
 import logging
 from docx import Document as DocxDocument
 import pandas as pd
-import torch
 import fitz  # PyMuPDF
-from docling_core.types.doc.document import DocTagsDocument, DoclingDocument
-from transformers import AutoProcessor, AutoModelForVision2Seq
-from transformers.image_utils import load_image
+from PIL import Image
 from urllib.parse import urlparse
 
+from app.config import ExtractionConfig
+from app.services.storage import StorageBackend, get_storage
+from app.services.extraction_cache import ExtractionCache, file_sha256, get_extraction_cache, make_cache_key
+from app.services.pdf_pages import (
+    ImageFilter, PageContent, drop_seen_images, extract_page_range, extract_pages, page_ranges
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SMOLDOCLING_MODEL = "ds4sd/SmolDocling-256M-preview"
+# Tăng khi thay đổi cách extract làm kết quả khác đi, để bỏ qua các entry cũ trong extraction cache
+EXTRACTOR_VERSION = "1"
+SMOLDOCLING_MESSAGES = [
+    {"role": "user", "content": [
+        {"type": "image"},
+        {"type": "text", "text": "Convert this page to docling."}
+    ]}
+]
+
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """requests.Session dùng chung cho cả process, giữ lại kết nối giữa các lần tải file."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http_session = session
+    return _http_session
+
+
 class FileExtractorService:
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        torch.set_default_device(self.device)
-        self.processor = AutoProcessor.from_pretrained("ds4sd/SmolDocling-256M-preview")
-        self.model = AutoModelForVision2Seq.from_pretrained("ds4sd/SmolDocling-256M-preview").to(self.device)
+    def __init__(self, config: Optional[ExtractionConfig] = None, cache: Optional[ExtractionCache] = None,
+                 storage: Optional[StorageBackend] = None):
+        self.config = config or ExtractionConfig()
+        self.cache = cache if cache is not None else get_extraction_cache()
+        self._storage = storage
+        self._pdf_pool: Optional[ProcessPoolExecutor] = None
+        self._pdf_pool_lock = threading.Lock()
+        # SmolDocling (and torch / transformers) are loaded on the first image extraction, not at import
+        self.device: Optional[str] = None
+        self._processor = None
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def _ensure_model(self) -> None:
+        """Load the SmolDocling processor and model once, on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self.device, self._processor, self._model = self._load_model()
+
+    @staticmethod
+    def _load_model() -> Tuple[str, object, object]:
+        """Import torch / transformers and load SmolDocling, returning (device, processor, model)."""
+        import torch
+        from transformers import AutoProcessor, AutoModelForVision2Seq
+
+        start_time = time.perf_counter()
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        processor = AutoProcessor.from_pretrained(SMOLDOCLING_MODEL)
+        # Batched generation needs left padding so every prompt ends where generation starts
+        processor.tokenizer.padding_side = "left"
+        model = AutoModelForVision2Seq.from_pretrained(SMOLDOCLING_MODEL).to(device)
+        logger.info(f"Loaded {SMOLDOCLING_MODEL} on {device} in {time.perf_counter() - start_time:.1f}s")
+        return device, processor, model
+
+    @property
+    def storage(self) -> StorageBackend:
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    @property
+    def processor(self):
+        self._ensure_model()
+        return self._processor
+
+    @property
+    def model(self):
+        self._ensure_model()
+        return self._model
 
     def _smoldocling_extract(self, image_path: str) -> str:
         """Extract content from an image using SmolDocling."""
+        return self.extract_images([image_path])[0]
+
+    def extract_images(self, images: List[Union[str, bytes, Image.Image]]) -> List[str]:
+        """Extract content from several images (paths/URLs, raw bytes or PIL images) using SmolDocling.
+        Images are padded and generated together in batches of `image_batch_size`, each with a budget
+        of `image_max_new_tokens` new tokens. Returns one markdown string per image, in input order
+        ("" for images that failed)."""
+        batch_size = max(1, self.config.image_batch_size)
+        results = []
+        for start in range(0, len(images), batch_size):
+            results.extend(self._extract_image_batch(images[start:start + batch_size]))
+        return results
+
+    def _extract_image_batch(self, batch: List[Union[str, bytes, Image.Image]]) -> List[str]:
+        results = [""] * len(batch)
+        loaded, positions = [], []
+        for position, item in enumerate(batch):
+            try:
+                loaded.append(self._load_image(item))
+                positions.append(position)
+            except Exception as e:
+                logger.error(f"Error loading image for smoldocling_extract: {str(e)}")
+        if not loaded:
+            return results
+
         try:
-            image = load_image(image_path)
-            messages = [
-                {"role": "user", "content": [
-                    {"type": "image"},
-                    {"type": "text", "text": "Convert this page to docling."}
-                ]}
-            ]
-            prompt = self.processor.apply_chat_template(messages, add_generation_prompt=True)
-            inputs = self.processor(text=prompt, images=[image], return_tensors="pt").to(self.device)
-            generated_ids = self.model.generate(**inputs, max_new_tokens=8192)
+            import torch
+            from docling_core.types.doc.document import DocTagsDocument, DoclingDocument
+
+            prompt = self.processor.apply_chat_template(SMOLDOCLING_MESSAGES, add_generation_prompt=True)
+            inputs = self.processor(
+                text=[prompt] * len(loaded),
+                images=[[image] for image in loaded],
+                padding=True,
+                return_tensors="pt"
+            ).to(self.device)
+            with torch.inference_mode():
+                generated_ids = self.model.generate(**inputs, max_new_tokens=self.config.image_max_new_tokens)
             prompt_len = inputs.input_ids.shape[1]
             trimmed = generated_ids[:, prompt_len:]
-            doctags = self.processor.batch_decode(trimmed, skip_special_tokens=False)[0].lstrip()
-            doctags_doc = DocTagsDocument.from_doctags_and_image_pairs([doctags], [image])
-            doc = DoclingDocument.load_from_doctags(doctags_doc)
-            return doc.export_to_markdown()
+            all_doctags = self.processor.batch_decode(trimmed, skip_special_tokens=False)
         except Exception as e:
             logger.error(f"Error in smoldocling_extract: {str(e)}")
-            return ""
+            return results
+
+        pad_token = self.processor.tokenizer.pad_token
+        for position, image, doctags in zip(positions, loaded, all_doctags):
+            if pad_token:
+                doctags = doctags.replace(pad_token, "")
+            try:
+                doctags_doc = DocTagsDocument.from_doctags_and_image_pairs([doctags.lstrip()], [image])
+                doc = DoclingDocument.load_from_doctags(doctags_doc)
+                results[position] = doc.export_to_markdown()
+            except Exception as e:
+                logger.error(f"Error converting doctags to markdown: {str(e)}")
+        return results
+
+    @staticmethod
+    def _load_image(image: Union[str, bytes, Image.Image]) -> Image.Image:
+        if isinstance(image, Image.Image):
+            return image
+        if isinstance(image, (bytes, bytearray)):
+            return Image.open(io.BytesIO(image)).convert("RGB")
+        from transformers.image_utils import load_image
+        return load_image(image)
+
+    def _image_filter(self) -> Optional[ImageFilter]:
+        """Which PDF images are worth running through the model (None: all of them)."""
+        if not self.config.pdf_image_filter:
+            return None
+        return ImageFilter(
+            min_text_coverage=self.config.pdf_min_text_coverage,
+            min_image_px=self.config.pdf_min_image_px,
+            min_area_ratio=self.config.pdf_min_image_area_ratio,
+            text_page_area_ratio=self.config.pdf_text_page_image_area_ratio
+        )
+
+    def _extract_pdf_images(self, pages: List[PageContent]) -> Dict[int, Tuple[str, List[str]]]:
+        """Run the images of `pages` through the model in one batched call.
+        Returns {page_num: (page_text, image_texts)}."""
+        images = [image for _, _, page_images in pages for _, image in page_images]
+        if images:
+            logger.info(f"Running {len(images)} PDF images through SmolDocling")
+        image_texts = iter(self.extract_images(images) if images else [])
+        return {
+            page_num: (page_text, [next(image_texts) for _ in page_images])
+            for page_num, page_text, page_images in pages
+        }
+
+    def _get_pdf_pool(self) -> ProcessPoolExecutor:
+        """Process pool for PDF page extraction, created on first use.
+        Uses spawn so workers only import PyMuPDF, not torch or the model."""
+        if self._pdf_pool is None:
+            with self._pdf_pool_lock:
+                if self._pdf_pool is None:
+                    self._pdf_pool = ProcessPoolExecutor(
+                        max_workers=self.config.pdf_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._pdf_pool
+
+    def _extract_pdf_parallel(self, file_path: str, page_count: int) -> str:
+        """Extract a PDF with page ranges fanned out to the process pool.
+        Ranges are consumed in page order, so an image repeated across ranges is dropped after
+        its first page before it reaches the model; each range's images go to the model while
+        the later ranges are still being read."""
+        pool = self._get_pdf_pool()
+        image_filter = self._image_filter()
+        futures = [
+            pool.submit(extract_page_range, file_path, start, end, image_filter)
+            for start, end in page_ranges(page_count, self.config.pdf_workers)
+        ]
+        pages: Dict[int, Tuple[str, List[str]]] = {}
+        seen_xrefs: Set[int] = set()
+        for future in futures:
+            range_pages = future.result()
+            if image_filter is not None:
+                range_pages = drop_seen_images(range_pages, seen_xrefs)
+            pages.update(self._extract_pdf_images(range_pages))
+        return self._join_pdf_pages(pages, page_count)
+
+    def _extract_pdf(self, file_path: str) -> str:
+        """Extract the text layer and embedded images of a PDF, in page order."""
+        doc = fitz.open(file_path)
+        try:
+            page_count = len(doc)
+            if not (self.config.pdf_parallel and page_count >= max(2, self.config.pdf_parallel_min_pages)):
+                pages = extract_pages(doc, 0, page_count, self._image_filter())
+                return self._join_pdf_pages(self._extract_pdf_images(pages), page_count)
+        finally:
+            doc.close()
+        return self._extract_pdf_parallel(file_path, page_count)
+
+    @staticmethod
+    def _join_pdf_pages(pages: Dict[int, Tuple[str, List[str]]], page_count: int) -> str:
+        parts = []
+        for page_num in range(page_count):
+            page_text, image_texts = pages[page_num]
+            parts.append(page_text + "\n\n")
+            parts.extend(image_text + "\n\n" for image_text in image_texts)
+        return "".join(parts)
+
+    def close(self) -> None:
+        if self._pdf_pool is not None:
+            self._pdf_pool.shutdown(wait=False, cancel_futures=True)
+            self._pdf_pool = None
+
+    def cache_version(self) -> str:
+        """Phiên bản extractor dùng trong key cache: gồm model và các cấu hình ảnh hưởng tới kết quả."""
+        image_filter = self._image_filter()
+        return f"{EXTRACTOR_VERSION}|{SMOLDOCLING_MODEL}|{self.config.image_max_new_tokens}|{tuple(image_filter) if image_filter else None}"
 
     def _download_file_from_url(self, file_url: str, file_extension: str) -> str:
-        """Download file from URL to temporary local file."""
+        """Download file from URL to a temporary local file, streaming it in chunks.
+        URLs that resolve to our storage (presigned MinIO URLs) are read directly instead of over HTTP."""
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
         try:
-            response = requests.get(file_url)
-            response.raise_for_status()
-            
-            # Create temporary file with proper extension
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-                temp_file.write(response.content)
-                return temp_file.name
+            with temp_file:
+                location = self.storage.resolve(file_url)
+                if location:
+                    self.storage.download(location, temp_file, self.config.download_chunk_size)
+                else:
+                    with get_http_session().get(file_url, stream=True, timeout=self.config.download_timeout) as response:
+                        response.raise_for_status()
+                        for chunk in response.iter_content(chunk_size=self.config.download_chunk_size):
+                            temp_file.write(chunk)
+            return temp_file.name
         except Exception as e:
             logger.error(f"Error downloading file from URL {file_url}: {str(e)}")
+            os.remove(temp_file.name)
             raise
 
     def extract_text(self, file_path: str, file_format: str = ".png") -> Optional[str]:
@@ -77,36 +297,20 @@ class FileExtractorService:
                 actual_file_path = file_path
                 
             extension = file_format
+            cache_key = None
+            if self.cache.enabled:
+                cache_key = make_cache_key(file_sha256(actual_file_path), self.cache_version(), extension)
+                cached_text = self.cache.get(cache_key)
+                if cached_text is not None:
+                    logger.info(f"Extraction cache hit for {file_path}")
+                    return cached_text
+
             text = ""
 
             if extension in ['.png', '.jpg', '.jpeg']:
                 text = self._smoldocling_extract(actual_file_path)
             elif extension == '.pdf':
-                doc = fitz.open(actual_file_path)
-                for page_num in range(len(doc)):
-                    page = doc[page_num]
-                    page_text = page.get_text("text")
-                    text += page_text + "\n\n"
-                    for img_index, img in enumerate(page.get_images(full=True)):
-                        xref = img[0]
-                        base_image = doc.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        # Use tempfile for cross-platform compatibility
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-                            temp_img_path = temp_file.name
-                            temp_file.write(image_bytes)
-                        try:
-                            page_text = self._smoldocling_extract(temp_img_path)
-                            text += page_text + "\n\n"
-                        except Exception as e:
-                            logger.error(f"Error processing PDF image: {str(e)}")
-                        finally:
-                            if os.path.exists(temp_img_path):
-                                try:
-                                    os.remove(temp_img_path)
-                                except Exception as e:
-                                    logger.warning(f"Failed to remove temp image {temp_img_path}: {str(e)}")
-                doc.close()
+                text = self._extract_pdf(actual_file_path)
 
             elif extension == '.docx':
                 doc = DocxDocument(actual_file_path)
@@ -151,7 +355,10 @@ class FileExtractorService:
             else:
                 raise ValueError(f"Unsupported file format: {extension}")
 
-            return text.strip()
+            text = text.strip()
+            if cache_key:
+                self.cache.set(cache_key, text)
+            return text
         except Exception as e:
             logger.error(f"Error extracting text from {file_path}: {str(e)}")
             return None
@@ -163,4 +370,50 @@ class FileExtractorService:
                 except Exception as e:
                     logger.warning(f"Failed to remove temporary file {temp_file_path}: {str(e)}")
 
-file_extractor_service = FileExtractorService()
\ No newline at end of file
+_worker_service: Optional[FileExtractorService] = None
+
+
+def _worker_extract_text(file_path: str, file_format: str) -> Optional[str]:
+    """Runs inside the dedicated extraction process; the service (and model) is created once per process."""
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = FileExtractorService()
+    return _worker_service.extract_text(file_path, file_format)
+
+
+class ExtractionWorkerClient:
+    """Runs extract_text in a dedicated process that owns the model, so the calling
+    process (e.g. the API) never imports torch or loads SmolDocling."""
+    def __init__(self, config: Optional[ExtractionConfig] = None):
+        self.config = config or ExtractionConfig()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def extract_text(self, file_path: str, file_format: str = ".png") -> Optional[str]:
+        try:
+            return self._get_pool().submit(_worker_extract_text, file_path, file_format).result()
+        except Exception as e:
+            logger.error(f"Error in extraction worker process for {file_path}: {str(e)}")
+            return None
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _create_file_extractor_service() -> Union[FileExtractorService, ExtractionWorkerClient]:
+    config = ExtractionConfig()
+    if config.use_worker_process:
+        return ExtractionWorkerClient(config)
+    return FileExtractorService(config)
+
+
+file_extractor_service = _create_file_extractor_service()
\ No newline at end of file
@@ -0,0 +1,134 @@
+# ingestion_queue.py
+# Hàng đợi (lưu trong database) để extract text và ingest file đính kèm vào RAG ngoài request chat.
+# API chỉ tạo job; ingestion_worker.py lấy job bằng SELECT ... FOR UPDATE SKIP LOCKED,
+# nên có thể chạy nhiều worker song song.
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import or_, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.file import File
+from app.models.ingestion_job import ACTIVE_JOB_CONDITION, IngestionJob
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def enqueue_file(db: Session, file_obj: File) -> IngestionJob:
+    """
+    Tạo job extract + ingest cho file, hoặc trả về job đang chờ / đang chạy của file đó.
+    Unique index một phần trên file_id (status pending / running) + ON CONFLICT DO NOTHING
+    đảm bảo hai request đồng thời cho cùng một file chỉ tạo một job.
+    Caller chịu trách nhiệm commit.
+    """
+    # Job đang chạy có thể vừa kết thúc giữa INSERT và SELECT, khi đó thử lại một lần
+    for _ in range(2):
+        job = _insert_pending_job(db, file_obj) or db.query(IngestionJob).filter(
+            IngestionJob.file_id == file_obj.file_id,
+            IngestionJob.status.in_(ACTIVE_STATUSES)
+        ).first()
+        if job:
+            return job
+    raise RuntimeError(f"Could not enqueue file {file_obj.file_id}")
+
+
+def _insert_pending_job(db: Session, file_obj: File) -> Optional[IngestionJob]:
+    """Thêm job "pending" cho file, None nếu file đã có job đang chờ / đang chạy."""
+    stmt = insert(IngestionJob).values(
+        file_id=file_obj.file_id,
+        user_id=file_obj.user_id,
+        status="pending"
+    ).on_conflict_do_nothing(
+        index_elements=[IngestionJob.file_id],
+        index_where=text(ACTIVE_JOB_CONDITION)
+    ).returning(IngestionJob.id)
+    job_id = db.execute(stmt).scalar()
+    return db.get(IngestionJob, job_id) if job_id is not None else None
+
+
+def get_jobs_for_user(db: Session, user_id, file_id: Optional[int] = None) -> List[IngestionJob]:
+    query = db.query(IngestionJob).filter(IngestionJob.user_id == user_id)
+    if file_id is not None:
+        query = query.filter(IngestionJob.file_id == file_id)
+    return query.order_by(IngestionJob.created_at.desc()).all()
+
+
+def requeue_stale_jobs(db: Session, stale_after_seconds: int) -> int:
+    """Đưa các job "running" quá stale_after_seconds (worker đã chết) về lại "pending"."""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    count = db.query(IngestionJob).filter(
+        IngestionJob.status == "running",
+        IngestionJob.started_at < cutoff
+    ).update({"status": "pending"}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def claim_next_job(db: Session) -> Optional[IngestionJob]:
+    """
+    Lấy job "pending" cũ nhất đã đến lượt thử (next_attempt_at) và đánh dấu "running".
+    Job đang bị worker khác khóa được bỏ qua.
+    """
+    job = db.query(IngestionJob).filter(
+        IngestionJob.status == "pending",
+        or_(IngestionJob.next_attempt_at.is_(None), IngestionJob.next_attempt_at <= datetime.utcnow())
+    ).order_by(IngestionJob.created_at).with_for_update(skip_locked=True).first()
+    if not job:
+        db.commit()
+        return None
+
+    job.status = "running"
+    job.attempts += 1
+    job.started_at = datetime.utcnow()
+    job.error = None
+    db.commit()
+    return job
+
+
+def process_job(db: Session, job: IngestionJob, extractor, rag, max_attempts: int = 3,
+                retry_backoff_seconds: float = 30) -> None:
+    """
+    Extract text của file (nếu chưa có), lưu vào files.extracted_text rồi ingest vào RAG.
+    Lỗi được ghi vào job; job được thử lại đến max_attempts lần, lần sau cách lần trước
+    retry_backoff_seconds * 2^(attempts - 1) giây.
+    """
+    try:
+        file_obj = db.query(File).filter(File.file_id == job.file_id).first()
+        if not file_obj:
+            raise ValueError(f"File {job.file_id} not found")
+
+        extracted_text = file_obj.extracted_text
+        if not extracted_text:
+            file_extension = os.path.splitext(file_obj.filename)[1].lower()
+            logger.info(f"Extracting text from file {file_obj.filename} with extension {file_extension}")
+            extracted_text = extractor.extract_text(file_obj.file_path, file_extension)
+            if not extracted_text:
+                raise ValueError(f"Could not extract text from file {file_obj.filename}")
+            file_obj.extracted_text = extracted_text
+            db.commit()
+
+        result = rag.ingest_file(extracted_text, file_obj.file_path)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Unknown ingestion error"))
+
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        logger.info(f"Ingestion job {job.id} done ({result.get('chunks_processed', 0)} chunks)")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ingestion job {job.id} failed (attempt {job.attempts}/{max_attempts}): {e}")
+        job.status = "pending" if job.attempts < max_attempts else "failed"
+        job.error = str(e)
+        job.finished_at = datetime.utcnow() if job.status == "failed" else None
+        job.next_attempt_at = (
+            datetime.utcnow() + timedelta(seconds=retry_backoff_seconds * 2 ** (job.attempts - 1))
+            if job.status == "pending" else None
+        )
+        db.commit()
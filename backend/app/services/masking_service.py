@@ -1,13 +1,16 @@
 import hashlib
-from presidio_analyzer import AnalyzerEngine
-from presidio_anonymizer import AnonymizerEngine
+from presidio_analyzer import BatchAnalyzerEngine
 from presidio_anonymizer.entities import OperatorConfig
 import os
 from dotenv import load_dotenv, find_dotenv
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, List
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
 from app.database.database import SessionLocal
 from app.models.pii_mapping import PiiMapping
+from app.config import MaskingConfig
+from app.services.cache_service import LRUCache
+from app.services.pii_engines import get_analyzer_engine, get_anonymizer_engine
 import logging
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
@@ -22,74 +25,112 @@ class PIIMaskerService:
     - Sinh pseudonym cho từng loại PII và lưu mapping vào database.
     """
 
-    def __init__(self):
+    def __init__(self, config=None):
         # Lấy secret key từ .env
         self.secret_key = os.getenv('SECRET_KEY', 'my_secret_key_123')
-        # Khởi tạo Presidio Analyzer và Anonymizer
-        self.analyzer = AnalyzerEngine()
-        self.anonymizer = AnonymizerEngine()
+        # Presidio Analyzer và Anonymizer dùng chung cho cả process (chỉ nạp spaCy model một lần)
+        self.analyzer = get_analyzer_engine()
+        self.anonymizer = get_anonymizer_engine()
+        # Batch analyzer dùng chung analyzer ở trên, chạy spaCy theo lô (nlp.pipe)
+        self.batch_analyzer = BatchAnalyzerEngine(analyzer_engine=self.analyzer)
         self.logger = logging.getLogger(__name__)
         # Thread pool cho database operations
         self.executor = ThreadPoolExecutor(max_workers=4)
+        # Cache các mapping đã lưu, key (entity_type, hash_key) -> pseudonym.
+        # Pseudonym là deterministic nên cache hit nghĩa là dòng đã có trong DB, bỏ qua lần ghi.
+        masking_config = config.masking if config is not None else MaskingConfig()
+        self.pseudonym_cache = LRUCache(
+            max_size=masking_config.pseudonym_cache_size,
+            ttl=masking_config.pseudonym_cache_ttl
+        )
 
-    def _save_pii_mapping_sync(self, entity_type: str, original_value: str, pseudonymized_value: str) -> str:
+    def _hash_key(self, value: str) -> str:
+        """Hash SHA-256 của giá trị gốc + secret key (dùng cho cột hash_key và pseudonym)."""
+        return hashlib.sha256((value + self.secret_key).encode()).hexdigest()
+
+    def _save_pii_mappings_sync(self, rows: List[Tuple[str, str, str]]) -> None:
         """
-        Sync version của save_pii_mapping để chạy trong thread pool
+        Sync version của save_pii_mappings để chạy trong thread pool.
+        - rows: Danh sách (entity_type, original_value, pseudonymized_value)
+        - Ghi tất cả bằng một câu INSERT ... ON CONFLICT DO UPDATE duy nhất
+          trên constraint unique_entity_value, chỉ một round trip và một commit.
         """
-        hash_val = hashlib.sha256((original_value + self.secret_key).encode()).hexdigest()
-        
+        # Postgres không cho phép một câu ON CONFLICT cập nhật cùng một dòng hai lần,
+        # nên loại bỏ các cặp (entity_type, original_value) trùng lặp trước.
+        # Các mapping đã có trong cache (cùng pseudonym) đã được lưu nên bỏ qua.
+        values = {}
+        for entity_type, original_value, pseudonymized_value in rows:
+            hash_key = self._hash_key(original_value)
+            if self.pseudonym_cache.get((entity_type, hash_key)) == pseudonymized_value:
+                continue
+            values[(entity_type, original_value)] = {
+                "entity_type": entity_type,
+                "original_value": original_value,
+                "pseudonymized_value": pseudonymized_value,
+                "hash_key": hash_key
+            }
+        if not values:
+            return
+
+        stmt = insert(PiiMapping).values(list(values.values()))
+        stmt = stmt.on_conflict_do_update(
+            constraint="unique_entity_value",
+            set_={
+                "pseudonymized_value": stmt.excluded.pseudonymized_value,
+                "hash_key": stmt.excluded.hash_key
+            }
+        )
+
         db = SessionLocal()
         try:
-            # Tìm xem đã có mapping này chưa
-            existing = db.query(PiiMapping).filter(
-                PiiMapping.entity_type == entity_type,
-                PiiMapping.original_value == original_value
-            ).first()
-            
-            if existing:
-                # Cập nhật mapping hiện có
-                existing.pseudonymized_value = pseudonymized_value
-                existing.hash_key = hash_val
-            else:
-                # Tạo mapping mới
-                new_mapping = PiiMapping(
-                    entity_type=entity_type,
-                    original_value=original_value,
-                    pseudonymized_value=pseudonymized_value,
-                    hash_key=hash_val
-                )
-                db.add(new_mapping)
-            
+            db.execute(stmt)
             db.commit()
-            return pseudonymized_value
-            
         except Exception as e:
-            self.logger.error(f"Error saving PII mapping: {e}")
+            self.logger.error(f"Error saving PII mappings: {e}")
             db.rollback()
-            return pseudonymized_value
+            return
         finally:
             db.close()
 
+        # Chỉ đưa vào cache sau khi đã ghi thành công
+        for row in values.values():
+            self.pseudonym_cache.set((row["entity_type"], row["hash_key"]), row["pseudonymized_value"])
+
+    def get_cache_stats(self) -> Dict[str, float]:
+        """
+        Thống kê cache pseudonym (hits, misses, evictions, ...).
+        """
+        return self.pseudonym_cache.stats()
+
+    async def save_pii_mappings(self, rows: List[Tuple[str, str, str]]) -> None:
+        """
+        Async version - lưu nhiều mapping (entity_type, original_value, pseudonym) vào database
+        bằng một lần upsert.
+        """
+        if not rows:
+            return
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.executor, self._save_pii_mappings_sync, rows)
+
+    def _save_pii_mapping_sync(self, entity_type: str, original_value: str, pseudonymized_value: str) -> str:
+        """
+        Sync version của save_pii_mapping để chạy trong thread pool
+        """
+        self._save_pii_mappings_sync([(entity_type, original_value, pseudonymized_value)])
+        return pseudonymized_value
+
     async def save_pii_mapping(self, entity_type: str, original_value: str, pseudonymized_value: str) -> str:
         """
         Async version - lưu mapping giữa giá trị gốc và pseudonym vào database.
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor, 
-            self._save_pii_mapping_sync, 
-            entity_type, 
-            original_value, 
-            pseudonymized_value
-        )
+        await self.save_pii_mappings([(entity_type, original_value, pseudonymized_value)])
+        return pseudonymized_value
 
-    async def generate_pseudonym(self, entity_type: str, value: str) -> str:
+    def _build_pseudonym(self, entity_type: str, value: str) -> str:
         """
-        Sinh pseudonym cho một giá trị PII dựa trên loại entity.
-        - entity_type: Loại thông tin nhạy cảm (NAME, EMAIL_ADDRESS, ...)
-        - value: Giá trị gốc cần ẩn danh hóa
+        Tính pseudonym (deterministic) cho một giá trị PII, không truy cập database.
         """
-        hash_val = hashlib.sha256((value + self.secret_key).encode()).hexdigest()[:6].upper()
+        hash_val = self._hash_key(value)[:6].upper()
         pseudonym_map = {
             "PERSON": f"Name_{hash_val}",
             "EMAIL_ADDRESS": f"Email_{hash_val}@example.com",
@@ -118,9 +159,57 @@ class PIIMaskerService:
             "FACILITY": f"LOCATION_{hash_val}",
             "VENDOR": f"ORGANIZATION_{hash_val}"
         }
-        pseudonym = pseudonym_map.get(entity_type, pseudonym_map["DEFAULT"])
+        return pseudonym_map.get(entity_type, pseudonym_map["DEFAULT"])
+
+    async def generate_pseudonym(self, entity_type: str, value: str) -> str:
+        """
+        Sinh pseudonym cho một giá trị PII dựa trên loại entity.
+        - entity_type: Loại thông tin nhạy cảm (NAME, EMAIL_ADDRESS, ...)
+        - value: Giá trị gốc cần ẩn danh hóa
+        """
+        pseudonym = self._build_pseudonym(entity_type, value)
         return await self.save_pii_mapping(entity_type, value, pseudonym)
 
+    def _anonymize_results(self, text: str, analyzer_results: list) -> Tuple[str, Dict[str, str], List[Tuple[str, str, str]]]:
+        """
+        Sinh pseudonym và thay thế các entity đã được phát hiện trong văn bản.
+        - analyzer_results: Kết quả từ AnalyzerEngine cho đúng văn bản `text`
+        - Trả về tuple (masked_text, mapping, rows) với mapping từ pseudonym -> original_value
+          và rows là các dòng (entity_type, original_value, pseudonym) cần lưu vào database.
+        """
+        if not analyzer_results:
+            return text, {}, []
+
+        # Tạo danh sách các operator tùy chỉnh cho từng entity và mapping
+        operators = {}
+        mapping = {}
+        rows = []
+
+        for res in analyzer_results:
+            original_value = text[res.start:res.end]
+            pseudonym = self._build_pseudonym(res.entity_type, original_value)
+            rows.append((res.entity_type, original_value, pseudonym))
+
+            # Operator theo entity type nhưng pseudonym tính theo giá trị của từng span,
+            # nên hai PERSON khác nhau trong cùng văn bản nhận hai pseudonym khác nhau
+            if res.entity_type not in operators:
+                operators[res.entity_type] = OperatorConfig(
+                    "custom",
+                    {"lambda": lambda value, entity_type=res.entity_type: self._build_pseudonym(entity_type, value)}
+                )
+
+            # Lưu mapping từ pseudonym về original value
+            mapping[pseudonym] = original_value
+
+        # Sử dụng AnonymizerEngine để xử lý thay thế
+        anonymized_result = self.anonymizer.anonymize(
+            text=text,
+            analyzer_results=analyzer_results,
+            operators=operators
+        )
+
+        return anonymized_result.text, mapping, rows
+
     async def mask_text(self, text: str) -> Tuple[str, Dict[str, str]]:
         """
         Phát hiện và masking tất cả PII trong văn bản đầu vào sử dụng AnonymizerEngine.
@@ -132,45 +221,71 @@ class PIIMaskerService:
 
             # Phân tích văn bản để tìm các entity PII
             analyzer_results = self.analyzer.analyze(text=text, language='en')
-            
-            if not analyzer_results:
-                return text, {}
 
-            # Tạo danh sách các operator tùy chỉnh cho từng entity và mapping
-            operators = {}
-            mapping = {}
-            
-            # Tạo tất cả pseudonyms async để speed up
-            pseudonym_tasks = []
-            for res in analyzer_results:
-                original_value = text[res.start:res.end]
-                task = self.generate_pseudonym(res.entity_type, original_value)
-                pseudonym_tasks.append((res, original_value, task))
-            
-            # Chờ tất cả pseudonyms được tạo
-            for res, original_value, task in pseudonym_tasks:
-                pseudonym = await task
-                
-                # Presidio AnonymizerEngine cần OperatorConfig object
-                operators[res.entity_type] = OperatorConfig("replace", {"new_value": pseudonym})
-                
-                # Lưu mapping từ pseudonym về original value
-                mapping[pseudonym] = original_value
-
-            # Sử dụng AnonymizerEngine để xử lý thay thế
-            anonymized_result = self.anonymizer.anonymize(
-                text=text,
-                analyzer_results=analyzer_results,
-                operators=operators
-            )
+            masked_text, mapping, rows = self._anonymize_results(text, analyzer_results)
+
+            # Lưu tất cả mapping của văn bản bằng một lần upsert
+            await self.save_pii_mappings(rows)
 
-            return anonymized_result.text, mapping
+            return masked_text, mapping
             
         except Exception as e:
             # Nếu có lỗi, log và trả về text gốc với mapping rỗng
             self.logger.error(f"Error masking text: {str(e)}")
             return text, {}
 
+    def _mask_texts_sync(self, texts: List[str], batch_size: int) -> Tuple[List[Tuple[str, Dict[str, str]]], List[Tuple[str, str, str]]]:
+        """
+        Phần CPU-bound của mask_texts (spaCy + anonymize), chạy trong thread pool.
+        - Trả về (results, rows) với results theo đúng thứ tự của `texts`
+          và rows là các mapping cần lưu vào database.
+        """
+        results: List[Tuple[str, Dict[str, str]]] = [("", {}) for _ in texts]
+
+        # Bỏ qua các văn bản rỗng giống như mask_text
+        indices = [i for i, text in enumerate(texts) if text and text.strip()]
+        if not indices:
+            return results, []
+
+        try:
+            batch_results = self.batch_analyzer.analyze_iterator(
+                texts=[texts[i] for i in indices],
+                language='en',
+                batch_size=batch_size
+            )
+        except Exception as e:
+            self.logger.error(f"Error analyzing text batch: {str(e)}")
+            for i in indices:
+                results[i] = (texts[i], {})
+            return results, []
+
+        all_rows = []
+        for i, analyzer_results in zip(indices, batch_results):
+            try:
+                masked_text, mapping, rows = self._anonymize_results(texts[i], analyzer_results)
+                results[i] = (masked_text, mapping)
+                all_rows.extend(rows)
+            except Exception as e:
+                self.logger.error(f"Error masking text: {str(e)}")
+                results[i] = (texts[i], {})
+        return results, all_rows
+
+    async def mask_texts(self, texts: List[str], batch_size: int = 32) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Phiên bản batch của mask_text cho các job xử lý hàng loạt (CSV/Excel, benchmark).
+        - Chạy spaCy pipeline một lần cho nhiều văn bản (nlp.pipe qua BatchAnalyzerEngine),
+          sau đó áp dụng recognizers cho từng document; phần này chạy trong thread pool
+          để không chặn event loop.
+        - Trả về danh sách (masked_text, mapping) theo đúng thứ tự của `texts`.
+        """
+        loop = asyncio.get_event_loop()
+        results, all_rows = await loop.run_in_executor(self.executor, self._mask_texts_sync, texts, batch_size)
+
+        # Một lần upsert cho cả batch
+        await self.save_pii_mappings(all_rows)
+
+        return results
+
 
 # Khởi tạo instance dùng chung cho service masking PII
 pii_masker_service = PIIMaskerService()
\ No newline at end of file
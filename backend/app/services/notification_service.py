@@ -6,6 +6,7 @@
 from typing import List, Optional
 import logging
 from presidio_analyzer import AnalyzerEngine
+from app.services.pii_engines import get_analyzer_engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,8 +17,8 @@ class NotificationService:
     - Sử dụng Presidio Analyzer để nhận diện các entity nhạy cảm.
     """
     def __init__(self):
-        # Khởi tạo Presidio Analyzer
-        self.analyzer: AnalyzerEngine = AnalyzerEngine()
+        # Dùng Presidio Analyzer chung của process thay vì nạp lại spaCy model
+        self.analyzer: AnalyzerEngine = get_analyzer_engine()
 
     async def detect_pii(self, text: str) -> List[dict]:
         """
@@ -0,0 +1,130 @@
+# pdf_pages.py
+# Hàm extract text + ảnh của một dải trang PDF, chạy trong process pool của FileExtractorService.
+# Module này chỉ import PyMuPDF để process con (spawn) khởi động nhanh, không tải torch / model.
+
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import fitz  # PyMuPDF
+
+# (số trang, text của trang, (xref, bytes) các ảnh trong trang theo thứ tự)
+PageContent = Tuple[int, str, List[Tuple[int, bytes]]]
+
+
+class ImageFilter(NamedTuple):
+    """
+    Ngưỡng để quyết định ảnh nào trong PDF cần đưa qua model OCR.
+    - min_text_coverage: Trang có các khối text chiếm ít nhất tỉ lệ này diện tích trang được coi là
+      đã có text layer (header / footer / chú thích ngắn không đủ).
+    - min_image_px: Ảnh có cạnh nhỏ hơn (pixel) là icon / logo, bỏ qua.
+    - min_area_ratio: Ảnh chiếm ít hơn tỉ lệ này của trang là ảnh trang trí, bỏ qua.
+    - text_page_area_ratio: Trên trang đã có text layer, chỉ OCR ảnh lớn hơn tỉ lệ này
+      (biểu đồ, bảng hay đoạn scan chèn vào).
+    """
+    min_text_coverage: float = 0.15
+    min_image_px: int = 100
+    min_area_ratio: float = 0.05
+    text_page_area_ratio: float = 0.3
+
+
+def _image_area_ratios(page: "fitz.Page") -> Dict[int, float]:
+    """Tỉ lệ diện tích hiển thị lớn nhất của mỗi ảnh (theo xref) so với diện tích trang."""
+    page_area = abs(page.rect.width * page.rect.height) or 1.0
+    ratios: Dict[int, float] = {}
+    for info in page.get_image_info(xrefs=True):
+        x0, y0, x1, y1 = info["bbox"]
+        xref = info.get("xref", 0)
+        ratios[xref] = max(ratios.get(xref, 0.0), abs((x1 - x0) * (y1 - y0)) / page_area)
+    return ratios
+
+
+def _text_coverage(page: "fitz.Page") -> float:
+    """Tỉ lệ diện tích trang được phủ bởi các khối text (block_type 0)."""
+    page_area = abs(page.rect.width * page.rect.height) or 1.0
+    text_area = sum(
+        abs((x1 - x0) * (y1 - y0))
+        for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks")
+        if block_type == 0 and text.strip()
+    )
+    return min(1.0, text_area / page_area)
+
+
+def select_image_xrefs(page: "fitz.Page", page_text: str, image_filter: ImageFilter,
+                       seen_xrefs: Set[int]) -> List[int]:
+    """
+    Chọn các ảnh của trang có khả năng chứa nội dung. Ảnh đã được chọn ở trang trước
+    (cùng xref, vd. logo lặp lại) không được chọn lại.
+    """
+    has_text_layer = bool(page_text.strip()) and _text_coverage(page) >= image_filter.min_text_coverage
+    min_ratio = image_filter.text_page_area_ratio if has_text_layer else image_filter.min_area_ratio
+    area_ratios = _image_area_ratios(page)
+
+    selected = []
+    for img in page.get_images(full=True):
+        xref, width, height = img[0], img[2], img[3]
+        if xref in seen_xrefs or min(width, height) < image_filter.min_image_px:
+            continue
+        # Không xác định được vị trí hiển thị thì giữ lại để không mất nội dung
+        if area_ratios.get(xref, 1.0) < min_ratio:
+            continue
+        seen_xrefs.add(xref)
+        selected.append(xref)
+    return selected
+
+
+def page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    """Chia [0, page_count) thành tối đa `workers` dải trang liên tiếp gần bằng nhau."""
+    workers = max(1, min(workers, page_count))
+    size, remainder = divmod(page_count, workers)
+    ranges = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < remainder else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def extract_pages(doc: "fitz.Document", start: int, end: int,
+                  image_filter: Optional[ImageFilter] = None) -> List[PageContent]:
+    """
+    Đọc text layer và ảnh nhúng của các trang [start, end) trong một document đã mở.
+    Với image_filter, chỉ giữ các ảnh được select_image_xrefs chọn; None để lấy mọi ảnh.
+    """
+    pages = []
+    seen_xrefs: Set[int] = set()
+    for page_num in range(start, end):
+        page = doc[page_num]
+        page_text = page.get_text("text")
+        if image_filter is None:
+            xrefs = [img[0] for img in page.get_images(full=True)]
+        else:
+            xrefs = select_image_xrefs(page, page_text, image_filter, seen_xrefs)
+        images = [(xref, doc.extract_image(xref)["image"]) for xref in xrefs]
+        pages.append((page_num, page_text, images))
+    return pages
+
+
+def drop_seen_images(pages: List[PageContent], seen_xrefs: Set[int]) -> List[PageContent]:
+    """
+    Bỏ các ảnh có xref đã gặp ở dải trang trước (extract_pages chỉ loại trùng trong một dải)
+    và thêm xref của các ảnh còn lại vào seen_xrefs.
+    """
+    result = []
+    for page_num, page_text, images in pages:
+        kept = []
+        for xref, image in images:
+            if xref not in seen_xrefs:
+                seen_xrefs.add(xref)
+                kept.append((xref, image))
+        result.append((page_num, page_text, kept))
+    return result
+
+
+def extract_page_range(file_path: str, start: int, end: int,
+                       image_filter: Optional[ImageFilter] = None) -> List[PageContent]:
+    """Mở file PDF và đọc các trang [start, end) (dùng trong process con)."""
+    doc = fitz.open(file_path)
+    try:
+        return extract_pages(doc, start, end, image_filter)
+    finally:
+        doc.close()
@@ -0,0 +1,40 @@
+# pii_engines.py
+# Registry dùng chung cho Presidio AnalyzerEngine / AnonymizerEngine.
+# AnalyzerEngine nạp spaCy model (vài trăm MB) nên chỉ khởi tạo một lần cho mỗi process,
+# mọi service (masking, notification, router) đều lấy instance từ đây.
+
+import logging
+import threading
+from presidio_analyzer import AnalyzerEngine
+from presidio_anonymizer import AnonymizerEngine
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_analyzer: AnalyzerEngine = None
+_anonymizer: AnonymizerEngine = None
+
+
+def get_analyzer_engine() -> AnalyzerEngine:
+    """
+    Trả về AnalyzerEngine dùng chung, khởi tạo (nạp spaCy model) ở lần gọi đầu tiên.
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _lock:
+            if _analyzer is None:
+                logger.info("Loading shared Presidio AnalyzerEngine")
+                _analyzer = AnalyzerEngine()
+    return _analyzer
+
+
+def get_anonymizer_engine() -> AnonymizerEngine:
+    """
+    Trả về AnonymizerEngine dùng chung.
+    """
+    global _anonymizer
+    if _anonymizer is None:
+        with _lock:
+            if _anonymizer is None:
+                _anonymizer = AnonymizerEngine()
+    return _anonymizer
@@ -0,0 +1,137 @@
+# semantic_cache.py
+# Cache câu trả lời theo độ tương đồng ngữ nghĩa (embedding) của câu hỏi.
+# Các câu hỏi gần giống nhau (chào hỏi, "bạn làm được gì", câu hỏi kiến thức chung)
+# dùng lại câu trả lời đã có thay vì gọi lại LLM.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _normalize_vector(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class SemanticCache:
+    """
+    Cache LRU thread-safe, tra cứu theo cosine similarity giữa các embedding.
+    - threshold: Độ tương đồng tối thiểu để coi là cache hit.
+    - max_size: Số phần tử tối đa, phần tử ít được dùng nhất sẽ bị loại bỏ.
+    - ttl: Thời gian sống (giây) của mỗi phần tử, None hoặc <= 0 để không hết hạn.
+    Các vector đã chuẩn hóa nằm trong một ma trận numpy (mỗi phần tử một dòng), nên mỗi lần
+    tra cứu chỉ là một phép nhân ma trận - vector.
+    Chỉ nên lưu dữ liệu đã được mask, vì cache được dùng chung giữa các user.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_size: int = 512, ttl: Optional[float] = 3600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl if ttl and ttl > 0 else None
+        # text -> slot (dòng trong ma trận), theo thứ tự LRU
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._expires_at = np.full(max(0, max_size), np.inf)
+        self._values: List[Any] = [None] * max(0, max_size)
+        self._texts: List[Optional[str]] = [None] * max(0, max_size)
+        self._free_slots: List[int] = list(range(max(0, max_size) - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _release(self, text: str) -> None:
+        slot = self._slots.pop(text)
+        self._vectors[slot] = 0.0
+        self._expires_at[slot] = np.inf
+        self._values[slot] = None
+        self._texts[slot] = None
+        self._free_slots.append(slot)
+
+    def _expire(self, now: float) -> None:
+        if self.ttl is None or not self._slots:
+            return
+        for slot in np.flatnonzero(self._expires_at <= now).tolist():
+            self._release(self._texts[slot])
+            self.expirations += 1
+
+    def get(self, embedding: Sequence[float]) -> Optional[Any]:
+        """Trả về giá trị của câu hỏi giống nhất nếu độ tương đồng >= threshold, ngược lại None."""
+        query = _normalize_vector(embedding)
+        with self._lock:
+            self._expire(time.monotonic())
+            best_slot = None
+            if self._slots and self._vectors is not None and self._vectors.shape[1] == query.shape[0]:
+                scores = self._vectors @ query
+                # Slot trống có vector 0, chỉ xét các slot đang dùng
+                occupied = np.fromiter(self._slots.values(), dtype=np.intp)
+                best = occupied[np.argmax(scores[occupied])]
+                if scores[best] >= self.threshold:
+                    best_slot = int(best)
+
+            if best_slot is None:
+                self.misses += 1
+                return None
+
+            self._slots.move_to_end(self._texts[best_slot])
+            self.hits += 1
+            return self._values[best_slot]
+
+    def set(self, text: str, embedding: Sequence[float], value: Any) -> None:
+        """Lưu giá trị cho câu hỏi `text`, loại bỏ phần tử cũ nhất nếu vượt max_size."""
+        if self.max_size <= 0:
+            return
+        vector = _normalize_vector(embedding)
+        expires_at = time.monotonic() + self.ttl if self.ttl else np.inf
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                # Lần đầu, hoặc đổi embedding model (số chiều khác): bắt đầu lại ma trận
+                self._slots.clear()
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+                self._expires_at[:] = np.inf
+                self._values = [None] * self.max_size
+                self._texts = [None] * self.max_size
+                self._free_slots = list(range(self.max_size - 1, -1, -1))
+
+            if text in self._slots:
+                slot = self._slots[text]
+            else:
+                if not self._free_slots:
+                    self._release(next(iter(self._slots)))
+                    self.evictions += 1
+                slot = self._free_slots.pop()
+                self._slots[text] = slot
+            self._slots.move_to_end(text)
+            self._vectors[slot] = vector
+            self._expires_at[slot] = expires_at
+            self._values[slot] = value
+            self._texts[slot] = text
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def clear(self) -> None:
+        with self._lock:
+            for text in list(self._slots):
+                self._release(text)
+
+    def stats(self) -> Dict[str, Any]:
+        """Trả về các bộ đếm hit/miss/eviction hiện tại."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._slots),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
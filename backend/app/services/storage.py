@@ -0,0 +1,184 @@
+# storage.py
+# Truy cập nội dung file đã upload mà không đi qua presigned URL.
+# File.file_path lưu presigned URL của MinIO; StorageBackend chuyển nó thành (bucket, key) rồi
+# đọc trực tiếp bằng get_object (có hỗ trợ đọc theo khoảng byte), bỏ một lượt HTTP + ký URL.
+# LocalStorage lưu file trong thư mục local với cùng cấu trúc <bucket>/<key>, dùng cho test.
+
+import logging
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class StorageLocation(NamedTuple):
+    bucket: str
+    key: str
+
+
+class StorageBackend(ABC):
+    """
+    Interface chung của các backend lưu file.
+    - resolve(): Chuyển file_path (presigned URL) thành StorageLocation, None nếu không thuộc backend.
+    - iter_chunks(): Đọc nội dung theo từng khối; offset / length để đọc một khoảng byte
+      (length=None: đọc đến hết, length=0: không đọc gì).
+    """
+
+    @abstractmethod
+    def resolve(self, file_path: str) -> Optional[StorageLocation]:
+        ...
+
+    def resolve_file(self, file_obj) -> Optional[StorageLocation]:
+        """StorageLocation của một bản ghi File (theo File.file_path)."""
+        return self.resolve(file_obj.file_path)
+
+    @abstractmethod
+    def size(self, location: StorageLocation) -> int:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, location: StorageLocation, offset: int = 0, length: Optional[int] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        ...
+
+    def download(self, location: StorageLocation, destination: BinaryIO,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Ghi toàn bộ nội dung vào file object `destination`, trả về số byte đã ghi."""
+        written = 0
+        for chunk in self.iter_chunks(location, chunk_size=chunk_size):
+            destination.write(chunk)
+            written += len(chunk)
+        return written
+
+
+def _check_range(offset: int, length: Optional[int]) -> None:
+    if offset < 0:
+        raise ValueError(f"Invalid offset: {offset}")
+    if length is not None and length < 0:
+        raise ValueError(f"Invalid length: {length}")
+
+
+def _split_bucket_key(path: str) -> Optional[StorageLocation]:
+    bucket, _, key = unquote(path).lstrip("/").partition("/")
+    if not bucket or not key:
+        return None
+    return StorageLocation(bucket, key)
+
+
+class MinioStorage(StorageBackend):
+    """Đọc object trong bucket của minio_service bằng get_object."""
+
+    def __init__(self, client=None, bucket: Optional[str] = None, endpoint: Optional[str] = None):
+        from app.services import minio_service
+        self.client = client or minio_service.minio_client
+        self.bucket = bucket or minio_service.MINIO_BUCKET
+        self.endpoint = endpoint or minio_service.MINIO_ENDPOINT
+
+    def resolve(self, file_path: str) -> Optional[StorageLocation]:
+        parsed = urlparse(file_path)
+        if parsed.scheme not in ("http", "https") or parsed.netloc != self.endpoint:
+            return None
+        location = _split_bucket_key(parsed.path)
+        return location if location and location.bucket == self.bucket else None
+
+    def size(self, location: StorageLocation) -> int:
+        return self.client.stat_object(location.bucket, location.key).size
+
+    def iter_chunks(self, location: StorageLocation, offset: int = 0, length: Optional[int] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        _check_range(offset, length)
+        if length == 0:
+            return
+        # get_object coi length=0 là đọc đến hết object
+        response = self.client.get_object(
+            location.bucket, location.key, offset=offset, length=0 if length is None else length
+        )
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+
+class LocalStorage(StorageBackend):
+    """Lưu file tại <root>/<bucket>/<key>. Nhận cùng dạng presigned URL như MinIO (bỏ qua host)."""
+
+    def __init__(self, root: str, bucket: str = "files"):
+        self.root = root
+        self.bucket = bucket
+
+    def _path(self, location: StorageLocation) -> str:
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, location.bucket, location.key))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"Invalid storage key: {location.key}")
+        return path
+
+    def resolve(self, file_path: str) -> Optional[StorageLocation]:
+        parsed = urlparse(file_path)
+        if parsed.scheme not in ("http", "https"):
+            return None
+        location = _split_bucket_key(parsed.path)
+        if location is None or location.bucket != self.bucket:
+            return None
+        try:
+            path = self._path(location)
+        except ValueError:
+            return None
+        return location if os.path.isfile(path) else None
+
+    def put(self, key: str, data: bytes) -> StorageLocation:
+        location = StorageLocation(self.bucket, key)
+        path = self._path(location)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return location
+
+    def size(self, location: StorageLocation) -> int:
+        return os.path.getsize(self._path(location))
+
+    def iter_chunks(self, location: StorageLocation, offset: int = 0, length: Optional[int] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        _check_range(offset, length)
+        remaining = length
+        with open(self._path(location), "rb") as f:
+            f.seek(offset)
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def download(self, location: StorageLocation, destination: BinaryIO,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        with open(self._path(location), "rb") as f:
+            shutil.copyfileobj(f, destination, chunk_size)
+        return self.size(location)
+
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Trả về StorageBackend dùng chung cho cả process, khởi tạo lần đầu từ StorageConfig."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                from app.config import StorageConfig
+                storage_config = StorageConfig()
+                if storage_config.backend == "local":
+                    _storage = LocalStorage(storage_config.local_root)
+                else:
+                    _storage = MinioStorage()
+    return _storage
@@ -1,18 +1,51 @@
-
 # unmasking_service.py
 # Service để khôi phục lại văn bản gốc từ văn bản đã được masking (unmasking).
 # Sử dụng mapping được truyền vào để thay thế pseudonym về giá trị gốc.
 
 import logging
-from typing import Optional, Dict
+import re
+from typing import Optional, Dict, Pattern, FrozenSet, Tuple
+from app.services.cache_service import LRUCache
 
 class PIIUnmaskerService:
     """
     Service để khôi phục lại văn bản gốc từ văn bản đã được masking (unmasking).
     - Sử dụng mapping dictionary để thay thế pseudonym về giá trị gốc.
+    - Các pseudonym được compile thành một regex alternation duy nhất (cache theo tập pseudonym),
+      văn bản chỉ cần quét một lần từ trái sang phải.
     """
-    def __init__(self):
+    def __init__(self, pattern_cache_size: int = 128):
         self.logger = logging.getLogger(__name__)
+        # Cache pattern đã compile, key là tập pseudonym của mapping
+        self._pattern_cache = LRUCache(max_size=pattern_cache_size)
+
+    def _get_matcher(self, mapping: Dict[str, str]) -> Optional[Tuple[Pattern, FrozenSet[str]]]:
+        """
+        Lấy (hoặc compile) regex khớp mọi pseudonym trong mapping, kèm tập các tiền tố
+        thực sự (proper prefix) của pseudonym dùng cho unmask dạng stream.
+        - Sắp xếp theo độ dài giảm dần để tại mỗi vị trí luôn khớp pseudonym dài nhất.
+        """
+        cache_key = frozenset(mapping)
+        matcher = self._pattern_cache.get(cache_key)
+        if matcher is None:
+            pseudonyms = sorted((p for p in mapping if p), key=len, reverse=True)
+            if not pseudonyms:
+                return None
+            pattern = re.compile("|".join(re.escape(p) for p in pseudonyms))
+            prefixes = frozenset(p[:i] for p in pseudonyms for i in range(1, len(p)))
+            matcher = (pattern, prefixes)
+            self._pattern_cache.set(cache_key, matcher)
+        return matcher
+
+    def _get_pattern(self, mapping: Dict[str, str]) -> Optional[Pattern]:
+        matcher = self._get_matcher(mapping)
+        return matcher[0] if matcher else None
+
+    def create_stream(self, mapping: Dict[str, str]) -> "StreamingUnmasker":
+        """
+        Tạo unmasker dạng stream cho một mapping (dùng cho token streaming từ LLM).
+        """
+        return StreamingUnmasker(self, mapping)
 
     def unmask_text(self, text: str, mapping: Dict[str, str]) -> str:
         """
@@ -25,13 +58,12 @@ class PIIUnmaskerService:
             if not text or not mapping:
                 return text
 
-            unmasked_text = text
-            
-            # Sắp xếp theo độ dài pseudonym giảm dần để tránh thay thế nhầm lẫn chuỗi con
-            sorted_mappings = sorted(mapping.items(), key=lambda x: len(x[0]), reverse=True)
-            
-            for pseudonym, original_value in sorted_mappings:
-                unmasked_text = unmasked_text.replace(pseudonym, original_value)
+            pattern = self._get_pattern(mapping)
+            if pattern is None:
+                return text
+
+            # Một lượt quét duy nhất, không thay thế lại trên phần đã được khôi phục
+            unmasked_text = pattern.sub(lambda m: mapping[m.group(0)], text)
 
             self.logger.info("Unmasking completed successfully.")
             return unmasked_text
@@ -40,5 +72,64 @@ class PIIUnmaskerService:
             self.logger.error(f"Error unmasking text: {str(e)}")
             return text
 
+class StreamingUnmasker:
+    """
+    Unmask văn bản theo từng delta (chunk) của stream.
+    - Pseudonym như `Name_3FA21C` có thể bị cắt giữa hai chunk, nên chỉ giữ lại phần đuôi
+      ngắn nhất còn có thể là tiền tố của một pseudonym, phần còn lại được unmask và trả về ngay.
+    - Gọi flush() khi stream kết thúc để lấy phần còn giữ lại.
+    """
+    def __init__(self, unmasker: PIIUnmaskerService, mapping: Dict[str, str]):
+        self.mapping = mapping or {}
+        self._matcher = unmasker._get_matcher(self.mapping) if self.mapping else None
+        self._buffer = ""
+
+    def _hold_index(self, pos: int) -> int:
+        """Vị trí nhỏ nhất >= pos mà phần đuôi từ đó là tiền tố thực sự của một pseudonym."""
+        prefixes = self._matcher[1]
+        for i in range(pos, len(self._buffer)):
+            if self._buffer[i:] in prefixes:
+                return i
+        return len(self._buffer)
+
+    def feed(self, delta: str) -> str:
+        """
+        Nhận thêm một đoạn text, trả về phần đã an toàn để gửi cho client (đã unmask).
+        """
+        if not delta:
+            return ""
+        if self._matcher is None:
+            return delta
+
+        self._buffer += delta
+        pattern = self._matcher[0]
+        output = []
+        pos = 0
+        while True:
+            hold = self._hold_index(pos)
+            match = pattern.search(self._buffer, pos)
+            # Một match bắt đầu trước điểm giữ lại là chắc chắn: không pseudonym dài hơn
+            # nào còn có thể bắt đầu tại đó hoặc trước đó.
+            if match and match.start() < hold:
+                output.append(self._buffer[pos:match.start()])
+                output.append(self.mapping[match.group(0)])
+                pos = match.end()
+                continue
+            output.append(self._buffer[pos:hold])
+            self._buffer = self._buffer[hold:]
+            break
+
+        return "".join(output)
+
+    def flush(self) -> str:
+        """
+        Kết thúc stream, trả về phần còn giữ lại (đã unmask).
+        """
+        remaining = self._buffer
+        self._buffer = ""
+        if not remaining or self._matcher is None:
+            return remaining
+        return self._matcher[0].sub(lambda m: self.mapping[m.group(0)], remaining)
+
 # Khởi tạo instance dùng chung cho service unmasking PII
-pii_unmasker_service = PIIUnmaskerService()
\ No newline at end of file
+pii_unmasker_service = PIIUnmaskerService()
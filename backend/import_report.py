@@ -0,0 +1,61 @@
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """
+    Đọc output của `python -X importtime`, trả về (module, self_us, cumulative_us) theo thứ tự import.
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def top_level_totals(rows: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Tổng thời gian import (self, microsecond) theo package gốc, vd. torch, transformers, app."""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        totals[name.split(".")[0]] += self_us
+    return totals
+
+
+def run_report(module: str = "app.main", top: int = 20) -> int:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent, capture_output=True, text=True
+    )
+    rows = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else f"import {module} failed")
+        return result.returncode
+
+    total_us = sum(self_us for _, self_us, _ in rows)
+    print(f"import {module}: {total_us / 1e6:.2f}s, {len(rows)} modules\n")
+
+    print("Theo package:")
+    for name, us in sorted(top_level_totals(rows).items(), key=lambda item: -item[1])[:top]:
+        print(f"  {us / 1e3:10.1f} ms  {name}")
+
+    print("\nTheo module (cumulative):")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative_us / 1e3:10.1f} ms  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Báo cáo thời gian import khi khởi động backend")
+    parser.add_argument("--module", default="app.main", help="Module cần đo (mặc định app.main)")
+    parser.add_argument("--top", type=int, default=20, help="Số dòng hiển thị")
+    args = parser.parse_args()
+    sys.exit(run_report(args.module, args.top))
@@ -51,6 +51,12 @@ def data_ingestion():
         
         # Process và ingest các file
         result = rag.ingest_directory(str(dir_path))
+        if result.get("success"):
+            logging.info(
+                f"Đã ingest {result.get('documents_ingested', 0)}/{len(txt_files)} file "
+                f"({result.get('chunks_processed', 0)} chunks, {result.get('failed_documents', 0)} lỗi) "
+                f"trong {result.get('processing_time', 0):.1f}s"
+            )
         return result.get("success", False)
         
     except Exception as e:
@@ -0,0 +1,85 @@
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+import warnings
+
+from app.config import Config
+from app.database.database import SessionLocal, engine
+from app.models import ingestion_job
+from app.services.agents.rag_agent import get_document_rag, close_document_rag
+from app.services.ingestion_queue import claim_next_job, process_job, requeue_stale_jobs
+
+warnings.filterwarnings('ignore')
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# Add project root to path if needed
+sys.path.append(str(Path(__file__).parent.parent))
+
+config = Config()
+
+
+def run_worker(once: bool = False) -> int:
+    """
+    Xử lý các job trong bảng ingestion_jobs: extract text file đính kèm và ingest vào RAG.
+
+    Args:
+        once: True để thoát khi hàng đợi trống, False để chờ job mới (poll định kỳ)
+
+    Returns:
+        int: Số job đã xử lý
+    """
+    # Import ở đây để chỉ worker (không phải API) tải model extraction
+    from app.services.extraction_service import file_extractor_service
+
+    queue_config = config.ingestion_queue
+    ingestion_job.Base.metadata.create_all(bind=engine)
+    rag = get_document_rag(config)
+    processed = 0
+
+    last_stale_check = None
+
+    with SessionLocal() as db:
+        while True:
+            # Kiểm tra định kỳ (cả khi hàng đợi luôn có job) để job của worker đã chết không bị treo mãi
+            if last_stale_check is None or time.monotonic() - last_stale_check >= queue_config.stale_check_interval:
+                requeued = requeue_stale_jobs(db, queue_config.stale_after_seconds)
+                if requeued:
+                    logging.info(f"Đưa {requeued} job bị treo về lại hàng đợi")
+                last_stale_check = time.monotonic()
+
+            job = claim_next_job(db)
+            if job is None:
+                if once:
+                    break
+                time.sleep(queue_config.poll_interval)
+                continue
+
+            logging.info(f"Xử lý job {job.id} (file {job.file_id}, lần {job.attempts})")
+            process_job(
+                db, job, file_extractor_service, rag,
+                max_attempts=queue_config.max_attempts,
+                retry_backoff_seconds=queue_config.retry_backoff_seconds
+            )
+            processed += 1
+
+    return processed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker extract + ingest file đính kèm vào RAG")
+    parser.add_argument("--once", action="store_true", help="Thoát khi hàng đợi trống")
+    args = parser.parse_args()
+
+    try:
+        count = run_worker(once=args.once)
+        logging.info(f"Đã xử lý {count} job.")
+    except KeyboardInterrupt:
+        print("Bị gián đoạn bởi người dùng.")
+        logging.info("Bị gián đoạn bởi người dùng.")
+    finally:
+        close_document_rag()
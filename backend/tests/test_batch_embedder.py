@@ -0,0 +1,76 @@
+import time
+import unittest
+
+from app.services.agents.rag_agent.batch_embedder import BatchEmbedder, TokenBucket, _rate_limit_delay
+
+
+class FakeResponse:
+   def __init__(self, status_code, headers=None):
+      self.status_code = status_code
+      self.headers = headers or {}
+
+
+class RateLimitError(Exception):
+   def __init__(self, retry_after=None):
+      super().__init__("429 Too Many Requests")
+      self.status_code = 429
+      self.response = FakeResponse(429, {"retry-after": retry_after} if retry_after else {})
+
+
+class FakeEmbeddings:
+   def __init__(self, failures=0):
+      self.failures = failures
+      self.batches = []
+
+   def embed_documents(self, texts):
+      if self.failures:
+         self.failures -= 1
+         raise RateLimitError(retry_after="0.01")
+      self.batches.append(list(texts))
+      return [[float(len(text))] for text in texts]
+
+
+class TestBatchEmbedder(unittest.TestCase):
+   def test_batches_keep_input_order(self):
+      model = FakeEmbeddings()
+      embedder = BatchEmbedder(model, batch_size=2, max_concurrency=3)
+      texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+      self.assertEqual(embedder.embed_documents(texts), [[1.0], [2.0], [3.0], [4.0], [5.0]])
+      self.assertEqual(sorted(len(batch) for batch in model.batches), [1, 2, 2])
+      embedder.close()
+
+   def test_retries_after_rate_limit(self):
+      model = FakeEmbeddings(failures=2)
+      embedder = BatchEmbedder(model, batch_size=10, max_retries=3)
+      self.assertEqual(embedder.embed_documents(["abc"]), [[3.0]])
+      embedder.close()
+
+   def test_gives_up_after_max_retries(self):
+      embedder = BatchEmbedder(FakeEmbeddings(failures=5), max_retries=1)
+      with self.assertRaises(RateLimitError):
+         embedder.embed_documents(["abc"])
+      embedder.close()
+
+   def test_other_errors_are_not_retried(self):
+      self.assertIsNone(_rate_limit_delay(ValueError("bad input")))
+      self.assertEqual(_rate_limit_delay(RateLimitError(retry_after="2")), 2.0)
+      self.assertEqual(_rate_limit_delay(RateLimitError()), 0.0)
+
+
+class TestTokenBucket(unittest.TestCase):
+   def test_throttles_to_rate(self):
+      bucket = TokenBucket(tokens_per_minute=6000)  # 100 tokens/s
+      bucket.acquire(6000)
+      start = time.monotonic()
+      bucket.acquire(10)
+      self.assertGreaterEqual(time.monotonic() - start, 0.08)
+
+   def test_unlimited_bucket_does_not_wait(self):
+      bucket = TokenBucket()
+      start = time.monotonic()
+      bucket.acquire(10 ** 9)
+      self.assertLess(time.monotonic() - start, 0.05)
+
+
+if __name__ == "__main__":
+   unittest.main()
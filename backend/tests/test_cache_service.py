@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import patch
+from app.services.cache_service import LRUCache
+
+class TestLRUCache(unittest.TestCase):
+   def test_get_set_counts_hits_and_misses(self):
+      cache = LRUCache(max_size=2)
+      cache.set("a", 1)
+
+      self.assertEqual(cache.get("a"), 1)
+      self.assertIsNone(cache.get("b"))
+      stats = cache.stats()
+      self.assertEqual(stats["hits"], 1)
+      self.assertEqual(stats["misses"], 1)
+
+   def test_evicts_least_recently_used(self):
+      cache = LRUCache(max_size=2)
+      cache.set("a", 1)
+      cache.set("b", 2)
+      cache.get("a")  # "b" becomes least recently used
+      cache.set("c", 3)
+
+      self.assertIsNone(cache.get("b"))
+      self.assertEqual(cache.get("a"), 1)
+      self.assertEqual(cache.get("c"), 3)
+      self.assertEqual(cache.stats()["evictions"], 1)
+
+   @patch('app.services.cache_service.time.monotonic')
+   def test_entries_expire_after_ttl(self, mock_monotonic):
+      mock_monotonic.return_value = 100.0
+      cache = LRUCache(max_size=10, ttl=5)
+      cache.set("a", 1)
+
+      mock_monotonic.return_value = 104.0
+      self.assertEqual(cache.get("a"), 1)
+      mock_monotonic.return_value = 106.0
+      self.assertIsNone(cache.get("a"))
+      self.assertEqual(cache.stats()["expirations"], 1)
+      self.assertEqual(len(cache), 0)
+
+   def test_zero_ttl_never_expires(self):
+      cache = LRUCache(max_size=10, ttl=0)
+      self.assertIsNone(cache.ttl)
+
+if __name__ == "__main__":
+   unittest.main()
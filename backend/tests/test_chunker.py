@@ -0,0 +1,58 @@
+import unittest
+
+from app.services.agents.rag_agent.chunker import MarkdownChunker
+
+
+def count_words(text):
+   return len(text.split())
+
+
+class TestMarkdownChunker(unittest.TestCase):
+   def test_small_sections_are_merged(self):
+      chunker = MarkdownChunker(chunk_size=50, chunk_overlap=0, token_counter=count_words)
+      chunks = chunker.split("# A\nfirst section\n\n# B\nsecond section")
+      self.assertEqual(chunks, ["# A\nfirst section\n\n# B\nsecond section"])
+
+   def test_sections_are_not_split_mid_heading(self):
+      chunker = MarkdownChunker(chunk_size=6, chunk_overlap=0, token_counter=count_words)
+      chunks = chunker.split("# A\none two three\n\n# B\nfour five six")
+      self.assertEqual(chunks, ["# A\none two three", "# B\nfour five six"])
+
+   def test_large_section_respects_chunk_size_and_keeps_heading_path(self):
+      chunker = MarkdownChunker(chunk_size=12, chunk_overlap=0, token_counter=count_words)
+      body = " ".join(f"Sentence {i} here." for i in range(10))
+      chunks = chunker.split(f"# Guide\n## Leave\n{body}")
+      self.assertGreater(len(chunks), 1)
+      for chunk in chunks:
+         self.assertLessEqual(count_words(chunk), 12)
+      for chunk in chunks[2:]:
+         self.assertTrue(chunk.startswith("Guide > Leave\n"))
+
+   def test_overlap_repeats_tail_of_previous_chunk(self):
+      chunker = MarkdownChunker(chunk_size=10, chunk_overlap=3, token_counter=count_words)
+      body = " ".join(f"Sentence {i} here." for i in range(6))
+      chunks = chunker.split(body)
+      self.assertIn("Sentence 2 here.", chunks[0])
+      self.assertTrue(chunks[1].startswith("Sentence 2 here."))
+
+   def test_headings_inside_code_blocks_are_ignored(self):
+      chunker = MarkdownChunker(chunk_size=10, chunk_overlap=0, token_counter=count_words)
+      chunks = chunker.split("# Setup\n```\n# comment\nprint(1)\n```")
+      self.assertEqual(chunks, ["# Setup\n```\n# comment\nprint(1)\n```"])
+
+   def test_oversized_table_is_split_on_line_boundaries(self):
+      chunker = MarkdownChunker(chunk_size=12, chunk_overlap=0, token_counter=count_words)
+      rows = [f"| row {i} | value {i} |" for i in range(6)]
+      chunks = chunker.split("\n".join(rows))
+      self.assertGreater(len(chunks), 1)
+      self.assertEqual("\n".join(chunks).splitlines(), rows)
+
+   def test_sentences_of_a_paragraph_are_joined_with_spaces(self):
+      chunker = MarkdownChunker(chunk_size=8, chunk_overlap=0, token_counter=count_words)
+      body = " ".join(f"Sentence {i} here." for i in range(4))
+      chunks = chunker.split(body)
+      self.assertEqual(chunks, ["Sentence 0 here. Sentence 1 here.", "Sentence 2 here. Sentence 3 here."])
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from app.services.embedding_cache import EmbeddingCache, normalize_text
+
+
+class FakeEmbeddings:
+   def __init__(self, model="text-embedding-test"):
+      self.model = model
+      self.calls = 0
+
+   def embed_query(self, text):
+      self.calls += 1
+      return [float(len(text)), 1.0, 0.5]
+
+   def embed_documents(self, texts):
+      self.calls += 1
+      self.last_batch = list(texts)
+      return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+   async def aembed_query(self, text):
+      return self.embed_query(text)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+   def test_normalize_text(self):
+      self.assertEqual(normalize_text("  what is\n the   policy? "), "what is the policy?")
+
+   def test_repeated_query_is_embedded_once(self):
+      cache = EmbeddingCache()
+      model = FakeEmbeddings()
+      first = cache.embed_query(model, "vacation policy")
+      second = cache.embed_query(model, "  vacation   policy ")
+      self.assertEqual(first, second)
+      self.assertEqual(model.calls, 1)
+
+   def test_sync_and_async_paths_share_entries(self):
+      cache = EmbeddingCache()
+      model = FakeEmbeddings()
+      cache.embed_query(model, "vacation policy")
+      asyncio.run(cache.aembed_query(model, "vacation policy"))
+      self.assertEqual(model.calls, 1)
+
+   def test_key_includes_model_name(self):
+      cache = EmbeddingCache()
+      first, second = FakeEmbeddings("model-a"), FakeEmbeddings("model-b")
+      cache.embed_query(first, "vacation policy")
+      cache.embed_query(second, "vacation policy")
+      self.assertEqual((first.calls, second.calls), (1, 1))
+
+   def test_embed_documents_only_sends_unknown_chunks(self):
+      cache = EmbeddingCache()
+      model = FakeEmbeddings()
+      cache.embed_query(model, "known chunk")
+      vectors = cache.embed_documents(model, ["known chunk", "new chunk", "new  chunk"])
+      self.assertEqual(model.last_batch, ["new chunk"])
+      self.assertEqual(vectors, [[11.0, 1.0, 0.5], [9.0, 1.0, 0.5], [9.0, 1.0, 0.5]])
+
+      cache.embed_documents(model, ["known chunk", "new chunk"])
+      self.assertEqual(model.calls, 2)
+
+   def test_sqlite_tier_survives_restart(self):
+      with tempfile.TemporaryDirectory() as tmp:
+         db_path = os.path.join(tmp, "embeddings.db")
+         cache = EmbeddingCache(db_path=db_path)
+         cache.embed_query(FakeEmbeddings(), "vacation policy")
+         cache.close()
+
+         restarted = EmbeddingCache(db_path=db_path)
+         model = FakeEmbeddings()
+         self.assertEqual(restarted.embed_query(model, "vacation policy"), [15.0, 1.0, 0.5])
+         self.assertEqual(model.calls, 0)
+         restarted.close()
+
+
+   def test_embed_documents_sends_original_text(self):
+      cache = EmbeddingCache()
+      model = FakeEmbeddings()
+      chunk = "# Policy\n\n- Item one\n- Item  two"
+      cache.embed_documents(model, [chunk])
+      self.assertEqual(model.last_batch, [chunk])
+
+   def test_async_query_uses_sqlite_tier(self):
+      with tempfile.TemporaryDirectory() as tmp:
+         db_path = os.path.join(tmp, "embeddings.db")
+         cache = EmbeddingCache(db_path=db_path)
+         asyncio.run(cache.aembed_query(FakeEmbeddings(), "vacation policy"))
+         cache.close()
+
+         restarted = EmbeddingCache(db_path=db_path)
+         model = FakeEmbeddings()
+         self.assertEqual(asyncio.run(restarted.aembed_query(model, "vacation policy")), [15.0, 1.0, 0.5])
+         self.assertEqual(model.calls, 0)
+         restarted.close()
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from app.services.extraction_cache import ExtractionCache, LocalCacheBackend, file_sha256, make_cache_key
+
+
+class FailingBackend:
+   def get(self, key):
+      raise OSError("backend unavailable")
+
+   def set(self, key, text):
+      raise OSError("backend unavailable")
+
+
+class TestExtractionCache(unittest.TestCase):
+   def test_file_sha256_depends_only_on_content(self):
+      with tempfile.TemporaryDirectory() as tmp:
+         paths = [os.path.join(tmp, name) for name in ("first.pdf", "second.pdf")]
+         for path in paths:
+            with open(path, "wb") as f:
+               f.write(b"%PDF-1.7 same bytes")
+         self.assertEqual(file_sha256(paths[0]), file_sha256(paths[1]))
+
+   def test_key_includes_version_and_format(self):
+      key = make_cache_key("abc", "1", ".pdf")
+      self.assertEqual(key, make_cache_key("abc", "1", ".PDF"))
+      self.assertNotEqual(key, make_cache_key("abc", "2", ".pdf"))
+      self.assertNotEqual(key, make_cache_key("abc", "1", ".txt"))
+
+   def test_local_backend_round_trip(self):
+      with tempfile.TemporaryDirectory() as tmp:
+         cache = ExtractionCache(LocalCacheBackend(tmp))
+         key = make_cache_key("abc", "1", ".pdf")
+         self.assertIsNone(cache.get(key))
+         cache.set(key, "Xin chào\nworld")
+         # A new instance (another process) reads the same entry
+         self.assertEqual(ExtractionCache(LocalCacheBackend(tmp)).get(key), "Xin chào\nworld")
+         self.assertEqual(cache.stats(), {"enabled": True, "hits": 0, "misses": 1})
+
+   def test_empty_text_is_not_cached(self):
+      with tempfile.TemporaryDirectory() as tmp:
+         cache = ExtractionCache(LocalCacheBackend(tmp))
+         cache.set("key", "")
+         self.assertIsNone(cache.get("key"))
+
+   def test_disabled_and_failing_backends(self):
+      disabled = ExtractionCache()
+      self.assertFalse(disabled.enabled)
+      disabled.set("key", "text")
+      self.assertIsNone(disabled.get("key"))
+
+      failing = ExtractionCache(FailingBackend())
+      failing.set("key", "text")
+      self.assertIsNone(failing.get("key"))
+
+
+if __name__ == '__main__':
+   unittest.main()
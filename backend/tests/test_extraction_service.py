@@ -1,17 +1,78 @@
 import os
+import tempfile
 import unittest
-from unittest.mock import patch, mock_open, MagicMock
-import pytest
-import pandas as pd
+from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from app.services.extraction_cache import ExtractionCache, LocalCacheBackend
 from app.services.extraction_service import FileExtractorService
+from app.services.storage import LocalStorage
+from app.services.pdf_pages import ImageFilter, page_ranges, select_image_xrefs
 
 class TestFileExtractorService(unittest.TestCase):
    def setUp(self):
-      # Mock the model loading since we don't want to actually load models in tests
-      with patch('app.services.extraction_service.AutoProcessor.from_pretrained'), \
-          patch('app.services.extraction_service.AutoModelForVision2Seq.from_pretrained'), \
-          patch('app.services.extraction_service.torch.cuda.is_available', return_value=False):
-         self.service = FileExtractorService()
+      # The model is loaded lazily, so constructing the service loads nothing; the extraction cache is disabled
+      self.service = FileExtractorService(cache=ExtractionCache(), storage=LocalStorage(tempfile.gettempdir()))
+   
+   def test_extraction_cache_skips_repeated_extraction(self):
+      with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as upload_dir:
+         service = FileExtractorService(cache=ExtractionCache(LocalCacheBackend(cache_dir)))
+         # Same bytes uploaded twice under different names
+         paths = [os.path.join(upload_dir, name) for name in ("a.docx", "b.docx")]
+         for path in paths:
+            with open(path, "wb") as f:
+               f.write(b"same document bytes")
+         
+         with patch('app.services.extraction_service.DocxDocument') as mock_docx:
+            mock_docx.return_value.paragraphs = [MagicMock(text="Cached paragraph")]
+            mock_docx.return_value.tables = []
+            first = service.extract_text(paths[0], ".docx")
+            second = service.extract_text(paths[1], ".docx")
+         
+         self.assertEqual(first, "Cached paragraph")
+         self.assertEqual(second, first)
+         mock_docx.assert_called_once()
+         self.assertEqual(service.cache.hits, 1)
+   
+   @patch('app.services.extraction_service.get_http_session')
+   def test_download_streams_chunks_to_disk(self, mock_get_session):
+      response = mock_get_session.return_value.get.return_value.__enter__.return_value
+      response.iter_content.return_value = [b"col1,col2\n", b"1,2\n"]
+      
+      path = self.service._download_file_from_url("https://example.com/data.csv", ".csv")
+      try:
+         with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"col1,col2\n1,2\n")
+      finally:
+         os.remove(path)
+      _, kwargs = mock_get_session.return_value.get.call_args
+      self.assertTrue(kwargs["stream"])
+   
+   @patch('app.services.extraction_service.get_http_session')
+   def test_download_reads_own_storage_directly(self, mock_get_session):
+      with tempfile.TemporaryDirectory() as root:
+         storage = LocalStorage(root)
+         storage.put("abc_report v2.pdf", b"pdf bytes")
+         service = FileExtractorService(cache=ExtractionCache(), storage=storage)
+         url = "http://localhost:9000/files/abc_report%20v2.pdf?X-Amz-Signature=sig"
+         
+         path = service._download_file_from_url(url, ".pdf")
+         try:
+            with open(path, "rb") as f:
+               self.assertEqual(f.read(), b"pdf bytes")
+         finally:
+            os.remove(path)
+      mock_get_session.assert_not_called()
+   
+   def test_model_is_loaded_lazily(self):
+      processor, model = MagicMock(), MagicMock()
+      with patch.object(FileExtractorService, '_load_model', return_value=("cpu", processor, model)) as mock_load:
+         service = FileExtractorService(cache=ExtractionCache())
+         mock_load.assert_not_called()
+         
+         self.assertIs(service.model, model)
+         self.assertIs(service.processor, processor)
+         mock_load.assert_called_once()
+         self.assertEqual(service.device, "cpu")
    
    @patch('app.services.extraction_service.FileExtractorService._smoldocling_extract')
    def test_extract_text_image(self, mock_extract):
@@ -26,32 +87,108 @@ class TestFileExtractorService(unittest.TestCase):
       self.assertEqual(result, "extracted image text")
    
    @patch('app.services.extraction_service.fitz.open')
-   @patch('app.services.extraction_service.FileExtractorService._smoldocling_extract')
-   @patch('builtins.open', new_callable=mock_open)
-   @patch('os.remove')
-   def test_extract_text_pdf(self, mock_remove, mock_file_open, mock_extract, mock_fitz_open):
+   @patch('app.services.extraction_service.FileExtractorService.extract_images')
+   def test_extract_text_pdf(self, mock_extract_images, mock_fitz_open):
       # Setup
       mock_doc = MagicMock()
       mock_page = MagicMock()
-      mock_page.get_text.return_value = "pdf text content"
-      mock_page.get_images.return_value = [(1, None, None, None, None, None)]  # xref, etc.
+      mock_page.get_text.side_effect = lambda option: (
+         [(50, 50, 550, 300, "pdf text content", 0, 0)] if option == "blocks" else "pdf text content"
+      )
+      mock_page.rect.width, mock_page.rect.height = 600, 800
+      mock_page.get_images.return_value = [(1, 0, 1200, 800, 8, "DeviceRGB")]  # xref, smask, width, height, ...
+      mock_page.get_image_info.return_value = [{"xref": 1, "bbox": (0, 0, 600, 400)}]
       mock_doc.__len__.return_value = 1
       mock_doc.__getitem__.return_value = mock_page
       mock_doc.extract_image.return_value = {"image": b"image_data"}
       mock_fitz_open.return_value = mock_doc
-      mock_extract.return_value = "extracted pdf image text"
+      mock_extract_images.return_value = ["extracted pdf image text"]
       
       # Execute
-      result = self.service.extract_text("test.pdf")
+      result = self.service.extract_text("test.pdf", ".pdf")
       
       # Verify
       mock_fitz_open.assert_called_once_with("test.pdf")
-      self.assertEqual(mock_page.get_text.call_count, 1)
-      mock_extract.assert_called_once()
-      mock_file_open.assert_called_once()
-      mock_remove.assert_called_once()
+      mock_page.get_text.assert_any_call("text")
+      mock_extract_images.assert_called_once_with([b"image_data"])
       self.assertEqual(result, "pdf text content\n\nextracted pdf image text")
    
+   @patch('app.services.extraction_service.fitz.open')
+   @patch('app.services.extraction_service.extract_page_range')
+   @patch('app.services.extraction_service.FileExtractorService.extract_images')
+   def test_extract_text_pdf_parallel(self, mock_extract, mock_extract_page_range, mock_fitz_open):
+      # Setup: 4 pages split over 2 workers, page 1 has a chart, the logo (xref 9) repeats on pages 1 and 3
+      mock_doc = MagicMock()
+      mock_doc.__len__.return_value = 4
+      mock_fitz_open.return_value = mock_doc
+      pages = {0: "page 0", 1: "page 1", 2: "page 2", 3: "page 3"}
+      images = {1: [(5, b"image_data"), (9, b"logo")], 3: [(9, b"logo")]}
+      mock_extract_page_range.side_effect = lambda path, start, end, image_filter: [
+         (num, pages[num], images.get(num, [])) for num in range(start, end)
+      ]
+      mock_extract.return_value = ["image on page 1", "logo"]
+      self.service.config.pdf_parallel = True
+      self.service.config.pdf_parallel_min_pages = 2
+      self.service.config.pdf_workers = 2
+      
+      # Execute
+      with ThreadPoolExecutor(max_workers=2) as pool, \
+          patch.object(FileExtractorService, '_get_pdf_pool', return_value=pool):
+         result = self.service.extract_text("test.pdf", ".pdf")
+      
+      # Verify
+      self.assertEqual(mock_extract_page_range.call_count, 2)
+      # The logo already seen in the first range is not sent to the model again
+      mock_extract.assert_called_once_with([b"image_data", b"logo"])
+      self.assertEqual(result, "page 0\n\npage 1\n\nimage on page 1\n\nlogo\n\npage 2\n\npage 3")
+   
+   def test_extract_images_batches(self):
+      # Setup: 5 images, batch size 2 -> 3 batches, results in input order
+      self.service.config.image_batch_size = 2
+      with patch.object(FileExtractorService, '_extract_image_batch',
+                        side_effect=lambda batch: [f"text {item}" for item in batch]) as mock_batch:
+         result = self.service.extract_images(["a", "b", "c", "d", "e"])
+      
+      # Verify
+      self.assertEqual([call.args[0] for call in mock_batch.call_args_list], [["a", "b"], ["c", "d"], ["e"]])
+      self.assertEqual(result, ["text a", "text b", "text c", "text d", "text e"])
+   
+   def _page(self, text, images, text_blocks=()):
+      # images: list of (xref, width_px, height_px, bbox) on a 600x800 page
+      # text_blocks: bboxes of the page's text blocks
+      page = MagicMock()
+      page.get_text.return_value = [(*bbox, text, i, 0) for i, bbox in enumerate(text_blocks)]
+      page.rect.width, page.rect.height = 600, 800
+      page.get_images.return_value = [(xref, 0, width, height, 8, "DeviceRGB") for xref, width, height, _ in images]
+      page.get_image_info.return_value = [{"xref": xref, "bbox": bbox} for xref, _, _, bbox in images]
+      return page, text
+   
+   def test_select_image_xrefs(self):
+      image_filter = ImageFilter(min_text_coverage=0.15, min_image_px=100, min_area_ratio=0.05, text_page_area_ratio=0.3)
+      text_layer = "Quarterly report " * 10
+      body = [(40, 100, 560, 700)]                    # 65% of the page
+      header_footer = [(0, 0, 600, 30), (0, 770, 600, 800)]  # 7.5% of the page
+      logo = (1, 60, 60, (10, 10, 40, 40))
+      banner = (2, 1200, 200, (0, 0, 600, 100))      # 12.5% of the page
+      chart = (3, 1200, 900, (0, 200, 600, 650))     # 56% of the page
+      
+      # Text page: only the large chart is worth OCR, the logo is too small, the banner decorative
+      seen = set()
+      page, text = self._page(text_layer, [logo, banner, chart], body)
+      self.assertEqual(select_image_xrefs(page, text, image_filter, seen), [3])
+      
+      # Scanned page (no text layer): the banner is kept, the chart was already seen on a previous page
+      page, text = self._page("", [logo, banner, chart])
+      self.assertEqual(select_image_xrefs(page, text, image_filter, seen), [2])
+      
+      # Image-heavy page with only a long header and footer: not a text page, so the banner is OCR'd too
+      page, text = self._page(text_layer, [logo, banner, chart], header_footer)
+      self.assertEqual(select_image_xrefs(page, text, image_filter, set()), [2, 3])
+   
+   def test_page_ranges(self):
+      self.assertEqual(page_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+      self.assertEqual(page_ranges(2, 4), [(0, 1), (1, 2)])
+   
    @patch('app.services.extraction_service.DocxDocument')
    def test_extract_text_docx(self, mock_docx):
       # Setup
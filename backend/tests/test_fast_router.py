@@ -0,0 +1,53 @@
+import unittest
+
+from app.services.agents.fast_router import FastRouter, extract_routing_examples
+
+PROMPT = """Available agents:
+CONVERSATION_AGENT examples:
+- "Hello, how are you?" → General greeting
+- "What's the weather like today?" → General question
+RAG_AGENT examples:
+- "What is our company's vacation policy?" → Document lookup
+- "Summarize the quarterly sales report" → Document lookup
+
+Output the result in JSON format.
+"""
+
+
+class TestFastRouter(unittest.TestCase):
+   def setUp(self):
+      self.router = FastRouter(extract_routing_examples(PROMPT))
+
+   def test_extract_routing_examples(self):
+      examples = extract_routing_examples(PROMPT)
+      self.assertEqual(examples["CONVERSATION_AGENT"], ["Hello, how are you?", "What's the weather like today?"])
+      self.assertEqual(len(examples["RAG_AGENT"]), 2)
+
+   def test_small_talk_goes_to_conversation(self):
+      for text in ["hello", "Thanks!", "good morning there", "cảm ơn bạn"]:
+         route = self.router.route(text)
+         self.assertEqual(route.agent, "CONVERSATION_AGENT", text)
+
+   def test_precheck_decides_small_talk_from_text_alone(self):
+      self.assertEqual(self.router.precheck("hello").reason, "small talk")
+      self.assertEqual(self.router.precheck("  ").reason, "empty query")
+      self.assertIsNone(self.router.precheck("What is our vacation policy?"))
+
+   def test_empty_knowledge_base_goes_to_conversation(self):
+      route = self.router.route("What is our vacation policy?", has_documents=False)
+      self.assertEqual(route.agent, "CONVERSATION_AGENT")
+
+   def test_fact_request_about_pseudonym_goes_to_rag(self):
+      route = self.router.route("What was the revenue of ORGANIZATION_1B2C3D last year?")
+      self.assertEqual(route.agent, "RAG_AGENT")
+
+   def test_similar_to_examples(self):
+      self.assertEqual(self.router.route("what is the company vacation policy").agent, "RAG_AGENT")
+      self.assertEqual(self.router.route("What's the weather like today").agent, "CONVERSATION_AGENT")
+
+   def test_uncertain_query_is_left_to_llm(self):
+      self.assertIsNone(self.router.route("Tell me a joke"))
+
+
+if __name__ == "__main__":
+   unittest.main()
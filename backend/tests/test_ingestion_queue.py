@@ -0,0 +1,137 @@
+import unittest
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.ingestion_queue import claim_next_job, enqueue_file, process_job, requeue_stale_jobs
+
+
+def make_job(attempts=1):
+   return SimpleNamespace(id=uuid.uuid4(), file_id=7, status="running", attempts=attempts,
+                          error=None, started_at=None, finished_at=None, next_attempt_at=None)
+
+
+class TestIngestionQueue(unittest.TestCase):
+   def setUp(self):
+      self.db = MagicMock()
+      self.file_obj = SimpleNamespace(file_id=7, user_id=uuid.uuid4(), filename="Report.PDF",
+                                      file_path="http://localhost:9000/files/report.pdf", extracted_text=None)
+      self.db.query.return_value.filter.return_value.first.return_value = self.file_obj
+      self.extractor = MagicMock()
+      self.rag = MagicMock()
+
+   def test_enqueue_uses_on_conflict_on_active_jobs(self):
+      job = make_job()
+      self.db.execute.return_value.scalar.return_value = job.id
+      self.db.get.return_value = job
+
+      self.assertIs(enqueue_file(self.db, self.file_obj), job)
+
+      sql = str(self.db.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+      self.assertIn("ON CONFLICT (file_id) WHERE status IN ('pending', 'running') DO NOTHING", sql)
+
+   def test_enqueue_returns_existing_active_job(self):
+      existing = make_job()
+      self.db.execute.return_value.scalar.return_value = None
+      self.db.query.return_value.filter.return_value.first.return_value = existing
+
+      self.assertIs(enqueue_file(self.db, self.file_obj), existing)
+      self.db.get.assert_not_called()
+
+   def test_claim_skips_locked_jobs(self):
+      job = SimpleNamespace(id=uuid.uuid4(), status="pending", attempts=0, started_at=None, error="old error")
+      query = self.db.query.return_value.filter.return_value.order_by.return_value
+      query.with_for_update.return_value.first.return_value = job
+
+      self.assertIs(claim_next_job(self.db), job)
+
+      query.with_for_update.assert_called_once_with(skip_locked=True)
+      conditions = [str(c.compile(dialect=postgresql.dialect())) for c in self.db.query.return_value.filter.call_args[0]]
+      self.assertTrue(any("next_attempt_at" in condition for condition in conditions))
+      self.assertEqual((job.status, job.attempts, job.error), ("running", 1, None))
+      self.assertIsNotNone(job.started_at)
+      self.db.commit.assert_called_once()
+
+   def test_claim_returns_none_when_queue_is_empty(self):
+      query = self.db.query.return_value.filter.return_value.order_by.return_value
+      query.with_for_update.return_value.first.return_value = None
+
+      self.assertIsNone(claim_next_job(self.db))
+      self.db.commit.assert_called_once()
+
+   def test_requeue_stale_jobs(self):
+      self.db.query.return_value.filter.return_value.update.return_value = 2
+
+      self.assertEqual(requeue_stale_jobs(self.db, stale_after_seconds=600), 2)
+      self.db.query.return_value.filter.return_value.update.assert_called_once_with(
+         {"status": "pending"}, synchronize_session=False
+      )
+      self.db.commit.assert_called_once()
+
+   def test_process_job_success(self):
+      job = make_job()
+      self.extractor.extract_text.return_value = "Extracted report"
+      self.rag.ingest_file.return_value = {"success": True, "chunks_processed": 3}
+
+      process_job(self.db, job, self.extractor, self.rag)
+
+      self.extractor.extract_text.assert_called_once_with(self.file_obj.file_path, ".pdf")
+      self.rag.ingest_file.assert_called_once_with("Extracted report", self.file_obj.file_path)
+      self.assertEqual(self.file_obj.extracted_text, "Extracted report")
+      self.assertEqual(job.status, "done")
+      self.assertIsNotNone(job.finished_at)
+
+   def test_process_job_reuses_extracted_text(self):
+      self.file_obj.extracted_text = "Already extracted"
+      self.rag.ingest_file.return_value = {"success": True}
+
+      process_job(self.db, make_job(), self.extractor, self.rag)
+
+      self.extractor.extract_text.assert_not_called()
+      self.rag.ingest_file.assert_called_once_with("Already extracted", self.file_obj.file_path)
+
+   def test_process_job_failure_is_retried_until_max_attempts(self):
+      self.extractor.extract_text.return_value = None
+
+      job = make_job(attempts=1)
+      process_job(self.db, job, self.extractor, self.rag, max_attempts=3)
+      self.assertEqual(job.status, "pending")
+      self.assertIn("Could not extract text", job.error)
+      self.assertIsNone(job.finished_at)
+      self.assertGreater(job.next_attempt_at, datetime.utcnow())
+      self.db.rollback.assert_called_once()
+
+      job = make_job(attempts=3)
+      process_job(self.db, job, self.extractor, self.rag, max_attempts=3)
+      self.assertEqual(job.status, "failed")
+      self.assertIsNotNone(job.finished_at)
+      self.assertIsNone(job.next_attempt_at)
+      self.rag.ingest_file.assert_not_called()
+
+   def test_retry_backoff_doubles_with_each_attempt(self):
+      self.extractor.extract_text.return_value = None
+
+      first, second = make_job(attempts=1), make_job(attempts=2)
+      process_job(self.db, first, self.extractor, self.rag, max_attempts=5, retry_backoff_seconds=60)
+      process_job(self.db, second, self.extractor, self.rag, max_attempts=5, retry_backoff_seconds=60)
+
+      now = datetime.utcnow()
+      self.assertAlmostEqual((first.next_attempt_at - now).total_seconds(), 60, delta=5)
+      self.assertAlmostEqual((second.next_attempt_at - now).total_seconds(), 120, delta=5)
+
+   def test_process_job_ingestion_error(self):
+      job = make_job(attempts=3)
+      self.extractor.extract_text.return_value = "Extracted report"
+      self.rag.ingest_file.return_value = {"success": False, "error": "Weaviate unavailable"}
+
+      process_job(self.db, job, self.extractor, self.rag, max_attempts=3)
+
+      self.assertEqual(job.status, "failed")
+      self.assertEqual(job.error, "Weaviate unavailable")
+
+
+if __name__ == '__main__':
+   unittest.main()
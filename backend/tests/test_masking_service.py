@@ -0,0 +1,139 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from presidio_analyzer import RecognizerResult
+from presidio_anonymizer import AnonymizerEngine
+
+from app.services.masking_service import PIIMaskerService
+
+
+class TestPIIMaskerService(unittest.TestCase):
+   def setUp(self):
+      # Presidio engines are mocked, no spaCy model is needed
+      with patch('app.services.masking_service.get_analyzer_engine'), \
+          patch('app.services.masking_service.get_anonymizer_engine'), \
+          patch('app.services.masking_service.BatchAnalyzerEngine'):
+         self.service = PIIMaskerService()
+      self.service.save_pii_mappings = AsyncMock()
+
+   def tearDown(self):
+      self.service.executor.shutdown(wait=False)
+
+   def test_same_entity_type_values_get_their_own_pseudonyms(self):
+      self.service.anonymizer = AnonymizerEngine()
+      text = "John Smith met Jane Doe"
+      results = [RecognizerResult("PERSON", 0, 10, 0.9), RecognizerResult("PERSON", 15, 23, 0.9)]
+
+      masked_text, mapping, rows = self.service._anonymize_results(text, results)
+
+      john = self.service._build_pseudonym("PERSON", "John Smith")
+      jane = self.service._build_pseudonym("PERSON", "Jane Doe")
+      self.assertNotEqual(john, jane)
+      self.assertEqual(masked_text, f"{john} met {jane}")
+      self.assertEqual(mapping, {john: "John Smith", jane: "Jane Doe"})
+      self.assertEqual(rows, [("PERSON", "John Smith", john), ("PERSON", "Jane Doe", jane)])
+
+   def test_mask_texts_keeps_input_order(self):
+      self.service.batch_analyzer.analyze_iterator.return_value = [["r1"], ["r2"], ["r3"]]
+      anonymize = lambda text, results: (f"masked {text}", {text: results[0]}, [("PERSON", text, results[0])])
+
+      with patch.object(self.service, '_anonymize_results', side_effect=anonymize):
+         results = asyncio.run(self.service.mask_texts(["a", "b", "c"]))
+
+      self.assertEqual(results, [("masked a", {"a": "r1"}), ("masked b", {"b": "r2"}), ("masked c", {"c": "r3"})])
+      # One upsert for the whole batch
+      self.service.save_pii_mappings.assert_awaited_once_with(
+         [("PERSON", "a", "r1"), ("PERSON", "b", "r2"), ("PERSON", "c", "r3")]
+      )
+
+   def test_mask_texts_skips_empty_inputs(self):
+      self.service.batch_analyzer.analyze_iterator.return_value = [[], []]
+
+      with patch.object(self.service, '_anonymize_results', side_effect=lambda text, results: (text, {}, [])):
+         results = asyncio.run(self.service.mask_texts(["", "first", "   \n", "second", None]))
+
+      self.assertEqual(results, [("", {}), ("first", {}), ("", {}), ("second", {}), ("", {})])
+      _, kwargs = self.service.batch_analyzer.analyze_iterator.call_args
+      self.assertEqual(kwargs["texts"], ["first", "second"])
+
+   def test_mask_texts_only_empty_inputs_skips_analyzer(self):
+      results = asyncio.run(self.service.mask_texts(["", "  "]))
+
+      self.assertEqual(results, [("", {}), ("", {})])
+      self.service.batch_analyzer.analyze_iterator.assert_not_called()
+
+   def test_mask_texts_analyzer_failure_returns_original_texts(self):
+      self.service.batch_analyzer.analyze_iterator.side_effect = RuntimeError("spaCy failed")
+
+      results = asyncio.run(self.service.mask_texts(["John Smith", "", "call 555-0100"]))
+
+      self.assertEqual(results, [("John Smith", {}), ("", {}), ("call 555-0100", {})])
+      self.service.save_pii_mappings.assert_awaited_once_with([])
+
+
+   @patch('app.services.masking_service.insert')
+   @patch('app.services.masking_service.SessionLocal')
+   def test_save_mappings_collapses_duplicates_into_one_upsert(self, mock_session_local, mock_insert):
+      db = mock_session_local.return_value
+      rows = [
+         ("PERSON", "John Smith", "Name_AAAAAA"),
+         ("PERSON", "John Smith", "Name_AAAAAA"),
+         ("EMAIL_ADDRESS", "john@corp.com", "Email_BBBBBB@example.com"),
+         ("PERSON", "John Smith", "Name_AAAAAA"),
+      ]
+
+      self.service._save_pii_mappings_sync(rows)
+
+      values = mock_insert.return_value.values.call_args[0][0]
+      self.assertEqual(
+         [(row["entity_type"], row["original_value"]) for row in values],
+         [("PERSON", "John Smith"), ("EMAIL_ADDRESS", "john@corp.com")]
+      )
+      db.execute.assert_called_once()
+      db.commit.assert_called_once()
+      db.close.assert_called_once()
+      self.assertEqual(self.service.pseudonym_cache.stats()["size"], 2)
+
+   @patch('app.services.masking_service.insert')
+   @patch('app.services.masking_service.SessionLocal')
+   def test_save_mappings_commit_failure_caches_nothing(self, mock_session_local, mock_insert):
+      db = mock_session_local.return_value
+      db.commit.side_effect = RuntimeError("connection lost")
+
+      self.service._save_pii_mappings_sync([("PERSON", "John Smith", "Name_AAAAAA")])
+
+      db.rollback.assert_called_once()
+      db.close.assert_called_once()
+      self.assertEqual(self.service.pseudonym_cache.stats()["size"], 0)
+
+      # Not cached, so the next call tries the write again
+      db.commit.side_effect = None
+      self.service._save_pii_mappings_sync([("PERSON", "John Smith", "Name_AAAAAA")])
+      self.assertEqual(db.execute.call_count, 2)
+
+
+   @patch('app.services.masking_service.insert')
+   @patch('app.services.masking_service.SessionLocal')
+   def test_cached_pseudonym_skips_database_write(self, mock_session_local, mock_insert):
+      pseudonym = self.service._build_pseudonym("PERSON", "John Smith")
+      self.service._save_pii_mappings_sync([("PERSON", "John Smith", pseudonym)])
+      self.assertEqual(mock_session_local.call_count, 1)
+
+      # Same value again: already persisted, so no session is opened
+      self.service._save_pii_mappings_sync([("PERSON", "John Smith", pseudonym)])
+      self.assertEqual(mock_session_local.call_count, 1)
+      self.assertEqual(self.service.get_cache_stats()["hits"], 1)
+
+      # Only the new value of a mixed batch is written
+      self.service._save_pii_mappings_sync([
+         ("PERSON", "John Smith", pseudonym),
+         ("PERSON", "Jane Doe", self.service._build_pseudonym("PERSON", "Jane Doe")),
+      ])
+      self.assertEqual(mock_session_local.call_count, 2)
+      values = mock_insert.return_value.values.call_args[0][0]
+      self.assertEqual([row["original_value"] for row in values], ["Jane Doe"])
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,63 @@
+import time
+import unittest
+
+from app.services.semantic_cache import SemanticCache
+
+
+class TestSemanticCache(unittest.TestCase):
+   def test_similar_embedding_hits(self):
+      cache = SemanticCache(threshold=0.95)
+      cache.set("hello", [1.0, 0.0, 0.0], "Hi there!")
+      self.assertEqual(cache.get([0.99, 0.05, 0.0]), "Hi there!")
+      self.assertEqual(cache.stats()["hits"], 1)
+
+   def test_dissimilar_embedding_misses(self):
+      cache = SemanticCache(threshold=0.95)
+      cache.set("hello", [1.0, 0.0, 0.0], "Hi there!")
+      self.assertIsNone(cache.get([0.0, 1.0, 0.0]))
+      self.assertEqual(cache.stats()["misses"], 1)
+
+   def test_returns_most_similar_entry(self):
+      cache = SemanticCache(threshold=0.5)
+      cache.set("a", [1.0, 0.0], "A")
+      cache.set("b", [0.8, 0.6], "B")
+      self.assertEqual(cache.get([0.7, 0.7]), "B")
+
+   def test_lru_eviction(self):
+      cache = SemanticCache(threshold=0.99, max_size=2)
+      cache.set("a", [1.0, 0.0, 0.0], "A")
+      cache.set("b", [0.0, 1.0, 0.0], "B")
+      cache.get([1.0, 0.0, 0.0])
+      cache.set("c", [0.0, 0.0, 1.0], "C")
+      self.assertEqual(cache.get([1.0, 0.0, 0.0]), "A")
+      self.assertIsNone(cache.get([0.0, 1.0, 0.0]))
+      self.assertEqual(cache.stats()["evictions"], 1)
+
+   def test_ttl_expiration(self):
+      cache = SemanticCache(threshold=0.9, ttl=0.01)
+      cache.set("a", [1.0, 0.0], "A")
+      time.sleep(0.02)
+      self.assertIsNone(cache.get([1.0, 0.0]))
+      self.assertEqual(len(cache), 0)
+
+
+   def test_reset_text_replaces_entry(self):
+      cache = SemanticCache(threshold=0.95, max_size=2)
+      cache.set("a", [1.0, 0.0], "A")
+      cache.set("a", [0.0, 1.0], "A2")
+      self.assertEqual(len(cache), 1)
+      self.assertIsNone(cache.get([1.0, 0.0]))
+      self.assertEqual(cache.get([0.0, 1.0]), "A2")
+
+   def test_other_dimension_misses(self):
+      cache = SemanticCache(threshold=0.9)
+      cache.set("a", [1.0, 0.0, 0.0], "A")
+      self.assertIsNone(cache.get([1.0, 0.0]))
+      # A new embedding model starts the cache over
+      cache.set("b", [1.0, 0.0], "B")
+      self.assertEqual(len(cache), 1)
+      self.assertEqual(cache.get([1.0, 0.0]), "B")
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,53 @@
+import io
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from app.services.storage import LocalStorage, StorageLocation
+
+
+class TestLocalStorage(unittest.TestCase):
+   def setUp(self):
+      self.tmp = tempfile.TemporaryDirectory()
+      self.storage = LocalStorage(self.tmp.name)
+      self.location = self.storage.put("3f2a_report.pdf", b"0123456789")
+
+   def tearDown(self):
+      self.tmp.cleanup()
+
+   def test_resolve_presigned_url_and_file(self):
+      url = "http://localhost:9000/files/3f2a_report.pdf?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Signature=abc"
+      self.assertEqual(self.storage.resolve(url), StorageLocation("files", "3f2a_report.pdf"))
+      self.assertEqual(self.storage.resolve_file(SimpleNamespace(file_path=url)), self.location)
+      self.assertIsNone(self.storage.resolve("http://localhost:9000/files/missing.pdf"))
+      self.assertIsNone(self.storage.resolve("https://example.com/report.pdf"))
+
+   def test_resolve_rejects_paths_the_backend_does_not_own(self):
+      self.assertIsNone(self.storage.resolve("3f2a_report.pdf"))
+      self.assertIsNone(self.storage.resolve("/tmp/3f2a_report.pdf"))
+      self.assertIsNone(self.storage.resolve("http://localhost:9000/other-bucket/3f2a_report.pdf"))
+      self.assertIsNone(self.storage.resolve("http://localhost:9000/files/..%2F..%2Fetc%2Fpasswd"))
+
+   def test_range_reads(self):
+      self.assertEqual(self.storage.size(self.location), 10)
+      self.assertEqual(b"".join(self.storage.iter_chunks(self.location, 2, 4)), b"2345")
+      self.assertEqual(b"".join(self.storage.iter_chunks(self.location, 8, 100)), b"89")
+      self.assertEqual(b"".join(self.storage.iter_chunks(self.location, 2, 0)), b"")
+      with self.assertRaises(ValueError):
+         list(self.storage.iter_chunks(self.location, 0, -1))
+      self.assertEqual(list(self.storage.iter_chunks(self.location, chunk_size=4)), [b"0123", b"4567", b"89"])
+
+   def test_download(self):
+      destination = io.BytesIO()
+      self.assertEqual(self.storage.download(self.location, destination), 10)
+      self.assertEqual(destination.getvalue(), b"0123456789")
+
+   def test_keys_cannot_escape_root(self):
+      with self.assertRaises(ValueError):
+         self.storage.put("../../outside.txt", b"x")
+      self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "..", "outside.txt")))
+
+
+if __name__ == '__main__':
+   unittest.main()
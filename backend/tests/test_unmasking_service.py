@@ -0,0 +1,96 @@
+import unittest
+from app.services.unmasking_service import PIIUnmaskerService
+
+class TestPIIUnmaskerService(unittest.TestCase):
+   def setUp(self):
+      self.service = PIIUnmaskerService()
+
+   def test_unmask_text_replaces_all_pseudonyms(self):
+      mapping = {"Name_3FA21C": "Rebecca Hill", "Email_ABC123@example.com": "rebecca@corp.com"}
+
+      result = self.service.unmask_text("Name_3FA21C wrote from Email_ABC123@example.com. Thanks Name_3FA21C", mapping)
+
+      self.assertEqual(result, "Rebecca Hill wrote from rebecca@corp.com. Thanks Rebecca Hill")
+
+   def test_unmask_text_prefers_longest_match(self):
+      mapping = {"PII_AB": "short", "PII_ABCD": "long"}
+
+      result = self.service.unmask_text("PII_ABCD and PII_AB", mapping)
+
+      self.assertEqual(result, "long and short")
+
+   def test_unmask_text_does_not_rescan_replaced_values(self):
+      mapping = {"Name_111111": "Name_222222", "Name_222222": "Alice"}
+
+      result = self.service.unmask_text("Name_111111", mapping)
+
+      self.assertEqual(result, "Name_222222")
+
+   def test_unmask_text_reuses_compiled_pattern(self):
+      mapping = {"Name_3FA21C": "Rebecca Hill"}
+      self.service.unmask_text("Name_3FA21C", mapping)
+      self.service.unmask_text("Name_3FA21C again", dict(mapping))
+
+      stats = self.service._pattern_cache.stats()
+      self.assertEqual(stats["misses"], 1)
+      self.assertEqual(stats["hits"], 1)
+
+   def test_unmask_text_empty_inputs(self):
+      self.assertEqual(self.service.unmask_text("", {"a": "b"}), "")
+      self.assertEqual(self.service.unmask_text("text", {}), "text")
+
+class TestStreamingUnmasker(unittest.TestCase):
+   def setUp(self):
+      self.service = PIIUnmaskerService()
+
+   def _stream(self, chunks, mapping):
+      stream = self.service.create_stream(mapping)
+      emitted = [stream.feed(chunk) for chunk in chunks]
+      emitted.append(stream.flush())
+      return emitted
+
+   def test_pseudonym_split_across_chunks(self):
+      mapping = {"Name_3FA21C": "Rebecca Hill"}
+
+      emitted = self._stream(["Hello Na", "me_3F", "A21C, how", " are you?"], mapping)
+
+      self.assertEqual(emitted[0], "Hello ")
+      self.assertEqual(emitted[1], "")
+      self.assertEqual("".join(emitted), "Hello Rebecca Hill, how are you?")
+
+   def test_emits_text_that_cannot_be_a_pseudonym(self):
+      mapping = {"Name_3FA21C": "Rebecca Hill"}
+
+      emitted = self._stream(["The answer is 42", "."], mapping)
+
+      self.assertEqual(emitted, ["The answer is 42", ".", ""])
+
+   def test_waits_for_longer_pseudonym(self):
+      mapping = {"PII_AB": "short", "PII_ABCD": "long"}
+
+      emitted = self._stream(["PII_AB", "CD and PII_AB", " done"], mapping)
+
+      self.assertEqual(emitted[0], "")
+      self.assertEqual("".join(emitted), "long and short done")
+
+   def test_flush_returns_held_prefix(self):
+      mapping = {"Name_3FA21C": "Rebecca Hill"}
+
+      emitted = self._stream(["ends with Name_3F"], mapping)
+
+      self.assertEqual("".join(emitted), "ends with Name_3F")
+
+   def test_matches_unmask_text_for_any_split(self):
+      mapping = {"Name_3FA21C": "Rebecca Hill", "Email_ABC123@example.com": "r@corp.com", "PII_AB": "x"}
+      text = "Name_3FA21C (Email_ABC123@example.com) PII_ABName_3FA21C."
+      expected = self.service.unmask_text(text, mapping)
+
+      for size in range(1, len(text) + 1):
+         chunks = [text[i:i + size] for i in range(0, len(text), size)]
+         self.assertEqual("".join(self._stream(chunks, mapping)), expected)
+
+   def test_no_mapping_passes_through(self):
+      self.assertEqual(self._stream(["a", "b"], {}), ["a", "b", ""])
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from app.services.agents.rag_agent.vectorstore_weaviate import VectorStore
+from app.services.embedding_cache import EmbeddingCache
+
+
+class FakeEmbeddings:
+   deployment = "text-embedding-test"
+
+   def __init__(self):
+      self.calls = 0
+
+   def embed_documents(self, texts):
+      self.calls += 1
+      return [[float(len(text)), 1.0] for text in texts]
+
+
+class FakeCollection:
+   """In-memory stand-in for a Weaviate collection (fetch by id + insert_many)."""
+   def __init__(self):
+      self.objects = {}
+      self.query = MagicMock()
+      self.query.fetch_objects.side_effect = self._fetch_objects
+      self.data = MagicMock()
+      self.data.insert_many.side_effect = self._insert_many
+
+   def _fetch_objects(self, filters, limit, return_properties):
+      # Filter.by_id().contains_any(ids) keeps the ids in its value
+      ids = {str(value) for value in filters.value}
+      return SimpleNamespace(objects=[SimpleNamespace(uuid=uuid) for uuid in self.objects if uuid in ids])
+
+   def _insert_many(self, data_objects):
+      for data_object in data_objects:
+         self.objects[str(data_object.uuid)] = data_object.properties
+
+
+class FakePool:
+   def __init__(self, *args, **kwargs):
+      self.collection = FakeCollection()
+      self.client = MagicMock()
+      self.client.collections.exists.return_value = True
+      self.client.collections.get.return_value = self.collection
+
+   @contextmanager
+   def connection(self):
+      yield self.client
+
+   def close(self):
+      pass
+
+
+class TestVectorStoreIngestion(unittest.TestCase):
+   def setUp(self):
+      self.embeddings = FakeEmbeddings()
+      rag = SimpleNamespace(
+         collection_name="Documents", embedding_model=self.embeddings, top_k=5,
+         weaviate_url="http://localhost:8080", weaviate_api_key="", chunk_size=64, chunk_overlap=0
+      )
+      with patch('app.services.agents.rag_agent.vectorstore_weaviate.WeaviateClientPool', FakePool):
+         self.store = VectorStore(SimpleNamespace(rag=rag))
+      cache_patch = patch('app.services.agents.rag_agent.vectorstore_weaviate.get_embedding_cache',
+                          return_value=EmbeddingCache())
+      cache_patch.start()
+      self.addCleanup(cache_patch.stop)
+      self.addCleanup(self.store.close_conn)
+
+   def test_reupload_under_new_url_inserts_nothing(self):
+      chunks = ["# Leave policy\n\nEmployees get 20 days.", "## Sick leave\n\nUp to 10 days."]
+      first_url = "http://localhost:9000/files/1a2b_policy.pdf?X-Amz-Signature=aaa"
+      second_url = "http://localhost:9000/files/9f8e_policy.pdf?X-Amz-Signature=bbb"
+
+      first_ids, first_objects = self.store.prepare_objects(chunks, first_url)
+      self.store.insert_objects(first_objects)
+      second_ids, second_objects = self.store.prepare_objects(chunks, second_url)
+      self.store.insert_objects(second_objects)
+
+      self.assertEqual(len(first_objects), 2)
+      self.assertEqual(second_objects, [])
+      self.assertEqual(first_ids, second_ids)
+      self.assertEqual(len(self.store.pool.collection.objects), 2)
+      self.assertEqual(self.store.pool.collection.data.insert_many.call_count, 1)
+      self.assertEqual(self.embeddings.calls, 1)
+
+
+if __name__ == '__main__':
+   unittest.main()